@@ -0,0 +1,67 @@
+"""Per-dataset-version memoization for derived data (rollups, indexes, ...)"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class VersionedCache:
+    """Keeps the latest computed value per key, tagged with the dataset version.
+
+    A value is recomputed the first time it is requested after the dataset
+    version changes; older versions are dropped. With ``max_entries`` set the
+    least recently used keys are evicted beyond that size.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[str, Any]]" = OrderedDict()
+        self._locks: "OrderedDict[Hashable, threading.Lock]" = OrderedDict()
+        self._guard = threading.Lock()
+
+    def _lock_for(self, key: Hashable) -> threading.Lock:
+        with self._guard:
+            lock = self._locks.setdefault(key, threading.Lock())
+            if self.max_entries is not None:
+                self._locks.move_to_end(key)
+                while len(self._locks) > self.max_entries:
+                    self._locks.popitem(last=False)
+            return lock
+
+    def _store(self, key: Hashable, version: str, value: Any) -> None:
+        with self._guard:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def get(self, key: Hashable, version: str, compute: Callable[[], Any]) -> Any:
+        """Cached value for ``key`` at ``version``, computing it at most once"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        with self._lock_for(key):
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+            value = compute()
+            self._store(key, version, value)
+            return value
+
+    def clear(self) -> None:
+        with self._guard:
+            self._entries.clear()
+
+
+derived_cache = VersionedCache()
+
+
+def cached_for(repo, key: Hashable, compute: Callable[[], Any]) -> Any:
+    """Memoize ``compute()`` for the repository's current dataset version.
+
+    Repositories that carry their own ``derived`` cache (in-memory snapshots)
+    keep derived data next to the snapshot instead of in the shared cache.
+    """
+    cache = getattr(repo, "derived", derived_cache)
+    return cache.get(key, repo.version(), compute)
@@ -0,0 +1,104 @@
+"""Capability bitsets for multi-criteria "hospitals that have all of X" queries.
+
+Every distinct specialty, equipment name, ICU type and support service is a
+capability, written ``kind:name`` (e.g. ``specialty:Cardiology``,
+``equipment:Cath Lab``, ``icu:NICU``, ``service:Blood Bank``). Support
+services running round the clock are also indexed as ``service_24x7:<name>``.
+
+For each capability the index keeps an int whose bit *i* is set when hospital
+*i* has it, so all/any/none queries are bitwise AND/OR/AND-NOT over those
+masks. A bare name without a kind matches that name under any kind.
+"""
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from cache import cached_for
+from repository import Repository
+
+def _capabilities_of(table: str, row: Dict) -> List[str]:
+    if row.get("is_active") is False:
+        return []
+    if table == "medical_specialties":
+        return [f"specialty:{row['specialty_name']}"] if row.get("specialty_name") and row.get("is_available", True) else []
+    if table == "hospital_equipment":
+        return [f"equipment:{row['equipment_name']}"] if row.get("equipment_name") and row.get("is_available", True) else []
+    if table == "icu_facilities":
+        return [f"icu:{row['icu_type']}"] if row.get("icu_type") and (row.get("total_beds") or 0) > 0 else []
+    if table == "support_services" and row.get("service_name"):
+        names = [f"service:{row['service_name']}"]
+        if row.get("operational_24x7"):
+            names.append(f"service_24x7:{row['service_name']}")
+        return names
+    return []
+
+
+class CapabilityIndex:
+    """Hospital bitmasks per capability"""
+
+    def __init__(self, hospitals: List[Dict], rows_by_table: Dict[str, List[Dict]]):
+        self.hospitals = [h for h in hospitals if h.get("name")]
+        position = {str(h.get("id")): i for i, h in enumerate(self.hospitals)}
+        self.all_mask = (1 << len(self.hospitals)) - 1
+
+        self.labels: Dict[str, str] = {}  # lower-cased capability -> display label
+        self.masks: Dict[str, int] = defaultdict(int)
+        for table, rows in rows_by_table.items():
+            for row in rows:
+                i = position.get(str(row.get("hospital_id")))
+                if i is None:
+                    continue
+                for capability in _capabilities_of(table, row):
+                    key = capability.lower()
+                    self.labels.setdefault(key, capability)
+                    self.masks[key] |= 1 << i
+
+        # Bare names resolve to the union of every kind carrying that name
+        self.bare: Dict[str, int] = defaultdict(int)
+        for key, mask in self.masks.items():
+            self.bare[key.split(":", 1)[1]] |= mask
+
+    def mask_for(self, term: str) -> Optional[int]:
+        key = term.strip().lower()
+        if ":" in key:
+            return self.masks.get(key)
+        return self.bare.get(key)
+
+    def catalog(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Known capabilities per kind with the number of hospitals offering each"""
+        grouped: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for key, label in sorted(self.labels.items()):
+            kind, name = label.split(":", 1)
+            grouped[kind].append({"capability": label, "name": name, "hospital_count": bin(self.masks[key]).count("1")})
+        return dict(grouped)
+
+    def query(self, all_of: List[str], any_of: List[str], none_of: List[str]) -> Dict[str, Any]:
+        """Hospitals having every ``all_of``, at least one ``any_of`` and no ``none_of``"""
+        unknown = [term for term in all_of + any_of + none_of if self.mask_for(term) is None]
+        if unknown:
+            return {"unknown": unknown, "hospitals": []}
+
+        result = self.all_mask
+        for term in all_of:
+            result &= self.mask_for(term)
+        if any_of:
+            union = 0
+            for term in any_of:
+                union |= self.mask_for(term)
+            result &= union
+        for term in none_of:
+            result &= ~self.mask_for(term)
+
+        matches = []
+        while result:
+            lowest = result & -result
+            matches.append(self.hospitals[lowest.bit_length() - 1])
+            result ^= lowest
+        return {"unknown": [], "hospitals": matches}
+
+
+def capability_index(repo: Repository) -> CapabilityIndex:
+    """Capability index at the current dataset version"""
+    return cached_for(repo, "capability_index", lambda: CapabilityIndex(
+        repo.all("hospitals"),
+        {table: repo.all(table) for table in ("medical_specialties", "hospital_equipment", "icu_facilities", "support_services")},
+    ))
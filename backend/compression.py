@@ -0,0 +1,99 @@
+"""Cached response bodies, compressed once per dataset version.
+
+Bodies are stored in identity, gzip and (when the optional ``brotli``
+package is installed) brotli form and picked per request from
+``Accept-Encoding``. Bodies below ``MIN_COMPRESS_SIZE`` are stored as-is.
+"""
+import gzip
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+MIN_COMPRESS_SIZE = 1024
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def _encodings_by_preference() -> List[str]:
+    return (["br"] if brotli is not None else []) + ["gzip"]
+
+
+def negotiate_encoding(accept_encoding: str, available: List[str]) -> Optional[str]:
+    """Best encoding from ``available`` allowed by an Accept-Encoding header"""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CachedBody:
+    """One response body and its precompressed variants"""
+
+    def __init__(self, body: bytes, media_type: str):
+        self.media_type = media_type
+        self.variants: Dict[Optional[str], bytes] = {None: body}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(body, quality=11)
+
+    @property
+    def size(self) -> int:
+        return sum(len(variant) for variant in self.variants.values())
+
+    def select(self, accept_encoding: str) -> Tuple[Optional[str], bytes]:
+        """(encoding, body) to send for the request's Accept-Encoding"""
+        available = [enc for enc in _encodings_by_preference() if enc in self.variants]
+        encoding = negotiate_encoding(accept_encoding, available) if available else None
+        return encoding, self.variants[encoding]
+
+
+class ResponseCache:
+    """LRU of cached bodies keyed by request, valid for one dataset version"""
+
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[str, CachedBody]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: str) -> Optional[CachedBody]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Hashable, version: str, cached: CachedBody) -> None:
+        if cached.size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1].size
+            self._entries[key] = (version, cached)
+            self._bytes += cached.size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
@@ -0,0 +1,97 @@
+"""Verification counters and a filterable index over document uploads"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from cache import cached_for
+from repository import Repository
+
+VERIFICATION_STATES = ["verified", "pending", "rejected"]
+DOCUMENT_DIMENSIONS = ["entity_type", "document_type", "verification_state"]
+
+
+def verification_state(doc: Dict) -> str:
+    """verified, pending or rejected for an upload row.
+
+    Only an explicit ``status`` marks a rejection; an unverified upload is
+    pending whether or not it carries a ``verification_date``.
+    """
+    status = (doc.get("status") or "").lower()
+    if status in VERIFICATION_STATES:
+        return status
+    return "verified" if doc.get("is_verified") else "pending"
+
+
+def _new_counter() -> Dict[str, int]:
+    return {"total": 0, "verified": 0, "pending": 0, "rejected": 0}
+
+
+class DocumentIndex:
+    """Uploads sorted by upload_date with posting lists per filter dimension.
+
+    Posting lists hold positions into the date-sorted rows, so they are
+    ascending and a date window is a bisect on each list.
+    """
+
+    def __init__(self, uploads: List[Dict]):
+        dated = sorted(uploads, key=lambda doc: str(doc.get("upload_date") or ""))
+        self.rows = [dict(doc, verification_state=verification_state(doc)) for doc in dated]
+        self.dates = [str(doc.get("upload_date") or "")[:10] for doc in self.rows]
+
+        self.postings: Dict[str, Dict[str, List[int]]] = {dim: defaultdict(list) for dim in DOCUMENT_DIMENSIONS + ["entity_id"]}
+        self.totals = _new_counter()
+        self.counters: Dict[str, Dict[str, Dict[str, int]]] = {dim: defaultdict(_new_counter) for dim in DOCUMENT_DIMENSIONS[:2]}
+        self.by_entity: Dict[str, Dict[str, Any]] = {}
+
+        for pos, doc in enumerate(self.rows):
+            state = doc["verification_state"]
+            for dim in self.postings:
+                self.postings[dim][str(doc.get(dim)).lower()].append(pos)
+
+            self.totals["total"] += 1
+            self.totals[state] += 1
+            for dim, counter in self.counters.items():
+                counter[str(doc.get(dim))]["total"] += 1
+                counter[str(doc.get(dim))][state] += 1
+
+            entity_key = f"{doc.get('entity_type')}:{doc.get('entity_id')}"
+            entity = self.by_entity.setdefault(entity_key, dict(
+                entity_type=doc.get("entity_type"), entity_id=doc.get("entity_id"), documents={}, **_new_counter()))
+            entity["total"] += 1
+            entity[state] += 1
+            entity["documents"][doc.get("document_type")] = {"status": state, "file_name": doc.get("file_name")}
+
+    def summary(self) -> Dict[str, Any]:
+        """Counters overall, per entity_type, per document_type and per entity"""
+        return {
+            **self.totals,
+            "by_entity_type": dict(self.counters["entity_type"]),
+            "by_document_type": dict(self.counters["document_type"]),
+            "by_entity": list(self.by_entity.values()),
+        }
+
+    def query(self, filters: Dict[str, Optional[str]], uploaded_from: Optional[str] = None,
+              uploaded_to: Optional[str] = None) -> List[Dict]:
+        """Rows matching every given filter and the inclusive upload-date window"""
+        lo = bisect_left(self.dates, uploaded_from) if uploaded_from else 0
+        hi = bisect_right(self.dates, uploaded_to) if uploaded_to else len(self.dates)
+
+        active = {dim: str(value).lower() for dim, value in filters.items() if value is not None}
+        if not active:
+            return self.rows[lo:hi]
+
+        # Walk the shortest posting list and probe the others by binary search
+        lists = sorted((self.postings[dim].get(value, []) for dim, value in active.items()), key=len)
+        shortest, others = lists[0], lists[1:]
+        start, stop = bisect_left(shortest, lo), bisect_left(shortest, hi)
+        return [self.rows[pos] for pos in shortest[start:stop] if all(_contains(other, pos) for other in others)]
+
+
+def _contains(positions: List[int], pos: int) -> bool:
+    i = bisect_left(positions, pos)
+    return i < len(positions) and positions[i] == pos
+
+
+def document_index(repo: Repository) -> DocumentIndex:
+    """Document upload index at the current dataset version"""
+    return cached_for(repo, "document_index", lambda: DocumentIndex(repo.all("document_uploads")))
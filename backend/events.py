@@ -0,0 +1,223 @@
+"""Server-sent change events for dataset updates.
+
+A single ``ChangeHub`` task watches the dataset version. When it changes, the
+hub diffs every public table (all but ``users``) against per-row fingerprints
+from the previous version and fans the resulting row deltas out to
+subscribers, each filtered by table and hospital. Subscribers are plain asyncio queues, so idle connections cost
+one queue and one suspended generator each. With the in-memory engine the
+hub is woken by every committed write instead of waiting for the next poll,
+and only the tables those writes touched are diffed.
+"""
+import asyncio
+import json
+import threading
+from contextlib import nullcontext
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from repository import PUBLIC_TABLES, Repository, _row_hospital_id
+
+POLL_INTERVAL_SECONDS = 1.0
+HEARTBEAT_SECONDS = 15.0
+SUBSCRIBER_QUEUE_SIZE = 256
+RETRY_MILLISECONDS = 5000
+
+# Table -> row id -> (fingerprint, hospital id, original id)
+Fingerprints = Dict[str, Dict[str, Tuple[int, Optional[str], Any]]]
+
+
+def _sse(event: str, data: Any, event_id: Optional[str] = None) -> str:
+    head = f"id: {event_id}\n" if event_id else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, separators=(',', ':'), default=str)}\n\n"
+
+
+class Subscriber:
+    """One event stream connection and its filters"""
+
+    __slots__ = ("tables", "hospitals", "rows", "queue", "overflowed")
+
+    def __init__(self, tables: Optional[Set[str]], hospitals: Optional[Set[str]], rows: bool):
+        self.tables = tables
+        self.hospitals = hospitals
+        self.rows = rows
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    @property
+    def filter_key(self) -> Tuple:
+        return (frozenset(self.tables or ()), frozenset(self.hospitals or ()), self.rows)
+
+
+class ChangeHub:
+    """Detects dataset changes and broadcasts row deltas to subscribers"""
+
+    def __init__(self, repo: Repository, poll_interval: float = POLL_INTERVAL_SECONDS):
+        self.repo = repo
+        self.poll_interval = poll_interval
+        self._subscribers: Set[Subscriber] = set()
+        self._fingerprints: Fingerprints = {}
+        self._version: Optional[str] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"changes_broadcast": 0, "messages_sent": 0, "overflows": 0}
+        self._listeners: List[Callable[[str, Dict[str, List[Dict[str, Any]]]], None]] = []
+        # Tables changed by commits up to _dirty_version, for engines that report them
+        self._dirty: Set[str] = set()
+        self._dirty_version: Optional[str] = None
+        self._dirty_lock = threading.Lock()
+
+    def add_listener(self, callback: Callable[[str, Dict[str, List[Dict[str, Any]]]], None]) -> None:
+        """Call ``callback(version, deltas)`` in the threadpool after each detected change"""
+        self._listeners.append(callback)
+
+    def row_ids(self, table: str) -> List[Tuple[Any, Optional[str]]]:
+        """``(id, hospital_id)`` of every row of ``table`` as of the last diff"""
+        return [(original_id, hospital_id) for _, hospital_id, original_id in self._fingerprints.get(table, {}).values()]
+
+    def _on_commit(self, snapshot: Any, changed: Set[str]) -> None:
+        """Snapshot listener, called on the writer thread"""
+        with self._dirty_lock:
+            self._dirty |= set(changed)
+            self._dirty_version = snapshot.version()
+
+    def _tables_to_diff(self, version: str) -> List[str]:
+        """Tables committed to since the last diff if every commit up to ``version`` has been reported, else all"""
+        with self._dirty_lock:
+            if self._dirty_version != version:
+                return list(PUBLIC_TABLES)
+            tables, self._dirty = [table for table in PUBLIC_TABLES if table in self._dirty], set()
+            return tables
+
+    def _diff(self) -> Tuple[str, Dict[str, List[Dict[str, Any]]]]:
+        """New version and per-table deltas since the previous one"""
+        pinned = getattr(self.repo, "pinned", None)
+        with pinned() if pinned else nullcontext():
+            # Without pinning, read the version first: rows newer than it only cause a redundant, empty diff later
+            version = self.repo.version()
+            names = self._tables_to_diff(version) if self._fingerprints else list(PUBLIC_TABLES)
+            tables = {table: self.repo.all(table) for table in names}
+
+        deltas: Dict[str, List[Dict[str, Any]]] = {}
+        fingerprints: Fingerprints = dict(self._fingerprints)
+        for table, rows in tables.items():
+            previous = self._fingerprints.get(table, {})
+            current = {}
+            changes = []
+            for row in rows:
+                row_id = str(row.get("id"))
+                entry = (hash(json.dumps(row, sort_keys=True, default=str)), _row_hospital_id(table, row), row.get("id"))
+                current[row_id] = entry
+                if previous.get(row_id) != entry:
+                    changes.append({"op": "upsert", "id": row.get("id"), "hospital_id": entry[1], "row": row})
+            for row_id, (_, hospital_id, original_id) in previous.items():
+                if row_id not in current:
+                    changes.append({"op": "delete", "id": original_id, "hospital_id": hospital_id})
+            fingerprints[table] = current
+            if changes:
+                deltas[table] = changes
+        self._fingerprints = fingerprints
+        return version, deltas
+
+    async def start(self) -> None:
+        self._wake = asyncio.Event()
+        if hasattr(self.repo, "add_listener"):
+            # Registered before the first diff so no commit after it goes unreported
+            loop = asyncio.get_running_loop()
+
+            def on_commit(previous: Any, snapshot: Any, changed: Set[str]) -> None:
+                self._on_commit(snapshot, changed)
+                loop.call_soon_threadsafe(self._wake.set)
+            self.repo.add_listener(on_commit)
+        self._version, _ = await run_in_threadpool(self._diff)
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                if await run_in_threadpool(self.repo.version) == self._version:
+                    continue
+                self._version, deltas = await run_in_threadpool(self._diff)
+            except Exception as e:
+                print(f"⚠️ Change detection failed: {e}")
+                continue
+            if deltas:
+                self._broadcast(self._version, deltas)
+                for callback in self._listeners:
+                    try:
+                        await run_in_threadpool(callback, self._version, deltas)
+                    except Exception as e:
+                        print(f"⚠️ Change listener failed: {e}")
+
+    def _message_for(self, subscriber: Subscriber, version: str, deltas: Dict[str, List[Dict[str, Any]]]) -> List[str]:
+        messages = []
+        for table, changes in deltas.items():
+            if subscriber.tables and table not in subscriber.tables:
+                continue
+            if subscriber.hospitals:
+                changes = [change for change in changes if change["hospital_id"] in subscriber.hospitals]
+            if not changes:
+                continue
+            if not subscriber.rows:
+                changes = [{key: value for key, value in change.items() if key != "row"} for change in changes]
+            messages.append(_sse("change", {
+                "version": version,
+                "table": table,
+                "upserted": sum(1 for change in changes if change["op"] == "upsert"),
+                "deleted": sum(1 for change in changes if change["op"] == "delete"),
+                "changes": changes,
+            }, event_id=version))
+        return messages
+
+    def _broadcast(self, version: str, deltas: Dict[str, List[Dict[str, Any]]]) -> None:
+        self._stats["changes_broadcast"] += 1
+        # Subscribers with identical filters share the encoded messages
+        encoded: Dict[Tuple, List[str]] = {}
+        for subscriber in list(self._subscribers):
+            key = subscriber.filter_key
+            if key not in encoded:
+                encoded[key] = self._message_for(subscriber, version, deltas)
+            for message in encoded[key]:
+                try:
+                    subscriber.queue.put_nowait(message)
+                    self._stats["messages_sent"] += 1
+                except asyncio.QueueFull:
+                    subscriber.overflowed = True
+                    self._stats["overflows"] += 1
+                    break
+
+    async def stream(self, tables: Optional[Set[str]], hospitals: Optional[Set[str]], rows: bool,
+                     last_event_id: Optional[str] = None) -> AsyncIterator[str]:
+        """SSE body for one connection; unsubscribes when the client goes away"""
+        subscriber = Subscriber(tables, hospitals, rows)
+        self._subscribers.add(subscriber)
+        try:
+            yield f"retry: {RETRY_MILLISECONDS}\n\n"
+            if last_event_id and last_event_id != self._version:
+                yield _sse("resync", {"version": self._version, "since": last_event_id}, event_id=self._version)
+            yield _sse("ready", {"version": self._version}, event_id=self._version)
+            while True:
+                if subscriber.overflowed:
+                    # The client fell too far behind: drop the backlog and ask it to refetch
+                    while not subscriber.queue.empty():
+                        subscriber.queue.get_nowait()
+                    subscriber.overflowed = False
+                    yield _sse("resync", {"version": self._version}, event_id=self._version)
+                try:
+                    yield await asyncio.wait_for(subscriber.queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            self._subscribers.discard(subscriber)
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats, subscribers=len(self._subscribers), version=self._version)
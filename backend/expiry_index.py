@@ -0,0 +1,72 @@
+"""Sorted expiry-date indexes over certifications and compliance licenses"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from cache import cached_for
+from repository import Repository
+
+# Source name -> (table, date field, type field)
+EXPIRY_SOURCES = {
+    "certifications": ("hospital_certifications", "expiry_date", "certification_type"),
+    "licenses": ("compliance_licenses", "valid_upto", "license_type"),
+}
+
+
+class DateIndex:
+    """Rows sorted by an ISO ``YYYY-MM-DD`` date field, queried by binary search"""
+
+    def __init__(self, rows: List[Dict], field: str):
+        dated = sorted(((str(row[field])[:10], row) for row in rows if row.get(field)), key=lambda pair: pair[0])
+        self.keys = [key for key, _ in dated]
+        self.rows = [row for _, row in dated]
+
+    def _bounds(self, start: Optional[str], end: Optional[str]) -> range:
+        lo = bisect_left(self.keys, start) if start else 0
+        hi = bisect_right(self.keys, end) if end else len(self.keys)
+        return range(lo, max(lo, hi))
+
+    def between(self, start: Optional[str], end: Optional[str]) -> List[Dict]:
+        """Rows with start <= date <= end (either bound may be open)"""
+        bounds = self._bounds(start, end)
+        return self.rows[bounds.start:bounds.stop]
+
+    def before(self, date: str) -> List[Dict]:
+        """Rows with date strictly earlier than ``date``"""
+        return self.rows[:bisect_left(self.keys, date)]
+
+    def count_between(self, start: Optional[str], end: Optional[str]) -> int:
+        return len(self._bounds(start, end))
+
+    def month_counts(self, start: Optional[str], end: Optional[str]) -> Dict[str, int]:
+        """Row counts per ``YYYY-MM`` within the range"""
+        counts: Dict[str, int] = defaultdict(int)
+        bounds = self._bounds(start, end)
+        for key in self.keys[bounds.start:bounds.stop]:
+            counts[key[:7]] += 1
+        return dict(counts)
+
+
+class ExpiryIndex:
+    """Date index for one source, overall and per certification/license type"""
+
+    def __init__(self, rows: List[Dict], date_field: str, type_field: str):
+        self.date_field = date_field
+        self.type_field = type_field
+        self.all = DateIndex(rows, date_field)
+        by_type: Dict[Any, List[Dict]] = defaultdict(list)
+        for row in rows:
+            by_type[row.get(type_field)].append(row)
+        self.by_type = {row_type: DateIndex(type_rows, date_field) for row_type, type_rows in by_type.items()}
+
+    def index_for(self, row_type: Optional[str]) -> Optional[DateIndex]:
+        if not row_type:
+            return self.all
+        lowered = row_type.lower()
+        return next((index for key, index in self.by_type.items() if str(key).lower() == lowered), None)
+
+
+def expiry_index(repo: Repository, source: str) -> ExpiryIndex:
+    """Expiry index for ``certifications`` or ``licenses`` at the current dataset version"""
+    table, date_field, type_field = EXPIRY_SOURCES[source]
+    return cached_for(repo, ("expiry_index", source), lambda: ExpiryIndex(repo.all(table), date_field, type_field))
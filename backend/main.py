@@ -1,14 +1,32 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-import json
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, StrictInt, StrictStr
+import asyncio
 import os
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 from collections import defaultdict
+from datetime import date
 
 import sys
-import os
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
+from repository import PUBLIC_TABLES, get_repository
+from rollups import BED_CAPACITY_GROUPS, bed_capacity_rollups
+from expiry_index import EXPIRY_SOURCES, expiry_index
+from document_index import VERIFICATION_STATES, document_index
+from compression import CachedBody, ResponseCache
+from wire_formats import render, requested_format
+from scoring import COMPONENT_FEATURES, hospital_scores, parse_weights
+from capabilities import capability_index
+from singleflight import analytics_flight, coalesced
+from snapshots import SnapshotRepository
+from timeseries import SERIES_METRICS, metric_store
+from provider_match import provider_index
+from events import ChangeHub
+from sync_index import from_micros, global_watermark, reconcile_deletes, sync_index, sync_log, to_micros, track_hub_deletes
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Hospital Mock API for Payer Dashboard",
@@ -36,52 +54,100 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def load_json_data(filename: str) -> Any:
-    """Load JSON data from file without caching and with structure normalization"""
-    file_path = os.path.join("data", filename)
+repo = get_repository()
+response_cache = ResponseCache()
+metric_store(repo)  # start recording metric history from the first dataset version
+change_hub = ChangeHub(repo)
+if not isinstance(repo, SnapshotRepository):
+    track_hub_deletes(repo, change_hub)  # the snapshot writer records its own tombstones
+
+# (cache key, dataset version) -> compression in progress, shared by concurrent misses
+compression_jobs: Dict[Any, "asyncio.Future[CachedBody]"] = {}
+
+def compress_once(key: Any, version: str, body: bytes, media_type: str) -> "asyncio.Future[CachedBody]":
+    """Start compressing a body unless a job for this key and version is already running"""
+    job = compression_jobs.get((key, version))
+    if job is None:
+        job = asyncio.ensure_future(run_in_threadpool(CachedBody, body, media_type))
+        compression_jobs[(key, version)] = job
+        
+        def finish(done: "asyncio.Future[CachedBody]") -> None:
+            compression_jobs.pop((key, version), None)
+            if not done.cancelled() and done.exception() is None:
+                response_cache.put(key, version, done.result())
+        job.add_done_callback(finish)
+    return job
+
+# GET routes whose body depends only on the dataset version and query string
+CACHEABLE_PREFIXES = (
+    "/hospitals", "/hospital_", "/hospital-contacts", "/search/", "/analytics/",
+    "/document", "/compliance/expiring", "/compliance/expiry-by-month",
+    "/wards_rooms", "/medical_specialties", "/doctors",
+)
+# Cacheable routes whose as_of parameter defaults to today
+DATED_ROUTES = {"/analytics/hospital-scores"}
+# Long-lived streams, which must not hold one snapshot for their whole lifetime
+STREAMING_ROUTES = {"/events"}
+
+@app.middleware("http")
+async def serve_precompressed(request: Request, call_next):
+    """Serve cached bodies, compressed once per dataset version, per Accept-Encoding"""
+    if request.method != "GET" or not request.url.path.startswith(CACHEABLE_PREFIXES):
+        return await call_next(request)
+    
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            
-            # Normalize data structure by extracting the list from the top-level key
-            if isinstance(data, dict):
-                # Common top-level keys that hold a list of items
-                for key in ["hospitals", "documents", "certifications", "users", "contacts", "equipment", "specialties", "wards", "rooms", "metrics"]:
-                    if key in data and isinstance(data[key], list):
-                        print(f"✅ Loaded {filename} and extracted list from '{key}' key")
-                        return data[key]
-                
-                # If no common list key is found, return the dictionary as is
-                print(f"✅ Loaded {filename} with custom dictionary structure")
-                return data
-            
-            elif isinstance(data, list):
-                print(f"✅ Loaded {filename} with list structure: {len(data)} items")
-                return data
-            else:
-                print(f"⚠️ Unexpected data type in {filename}: {type(data)}")
-                return data
-
-    except FileNotFoundError:
-        print(f"❌ File not found: {filename}")
-        raise HTTPException(status_code=404, detail=f"Data file {filename} not found")
-    except json.JSONDecodeError as e:
-        print(f"❌ JSON decode error in {filename}: {e}")
-        raise HTTPException(status_code=500, detail=f"Invalid JSON in {filename}")
-    except Exception as e:
-        print(f"❌ Unexpected error loading {filename}: {e}")
-        raise HTTPException(status_code=500, detail=f"Error loading {filename}")
-
-def get_list_from_data(data: Any) -> List[Dict]:
-    """Helper to ensure we get a list from loaded JSON data"""
-    if isinstance(data, list):
-        return data
-    if isinstance(data, dict):
-        # Check for common keys that might contain the list
-        for key in ["hospitals", "documents", "certifications", "users", "contacts", "equipment", "specialties", "wards", "rooms", "metrics"]:
-            if key in data and isinstance(data[key], list):
-                return data[key]
-    return [] # Return empty list if no list is found
+        wire_format = requested_format(request)
+    except HTTPException:
+        wire_format = None  # the route itself rejects the request
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())), wire_format)
+    if request.url.path in DATED_ROUTES and "as_of" not in request.query_params:
+        key += (date.today().isoformat(),)
+    version = await run_in_threadpool(repo.version)
+    cached = response_cache.get(key, version)
+    if cached is None:
+        job = compression_jobs.get((key, version))
+        if job is None:
+            response = await call_next(request)
+            if response.status_code != 200:
+                return response
+            body = b"".join([chunk async for chunk in response.body_iterator])
+            job = compress_once(key, version, body, response.headers.get("content-type", "application/json"))
+        # Shielded so a client going away does not cancel the job other requests wait on
+        cached = await asyncio.shield(job)
+    
+    encoding, body = cached.select(request.headers.get("accept-encoding", ""))
+    # Without ?format= the wire format was negotiated from Accept
+    headers = {"Vary": "Accept-Encoding" if "format" in request.query_params else "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, headers=headers, media_type=cached.media_type)
+
+@app.middleware("http")
+async def pin_snapshot(request: Request, call_next):
+    """Serve each request from a single dataset snapshot, even if a write lands mid-request"""
+    if not isinstance(repo, SnapshotRepository) or request.url.path in STREAMING_ROUTES:
+        return await call_next(request)
+    with repo.pinned():
+        return await call_next(request)
+
+@app.on_event("startup")
+async def start_change_hub():
+    # Before any write is accepted, so the rows compared are the ones left by the last run
+    await run_in_threadpool(reconcile_deletes, repo)
+    await change_hub.start()
+
+@app.on_event("shutdown")
+async def stop_change_hub():
+    await change_hub.stop()
+
+def parse_date_param(value: Optional[str], name: str) -> Optional[str]:
+    """Validate an optional YYYY-MM-DD query parameter"""
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be a date in YYYY-MM-DD format")
 
 # ================================
 # HOSPITAL ENDPOINTS
@@ -98,8 +164,38 @@ def root():
         "documentation": "/docs",
     }
 
+@app.get("/metrics/singleflight", tags=["Info"])
+def get_singleflight_metrics():
+    """Request coalescing counters for the expensive analytics endpoints"""
+    return analytics_flight.stats()
+
+@app.get("/metrics/events", tags=["Info"])
+def get_event_metrics():
+    """Change event stream counters and subscriber count"""
+    return change_hub.stats()
+
+@app.get("/events", tags=["Events"])
+async def stream_events(
+    request: Request,
+    tables: Optional[str] = Query(None, description="Comma-separated tables to follow, e.g. wards_rooms,hospital_certifications (default: all)"),
+    hospital_id: Optional[str] = Query(None, description="Comma-separated hospital ids to follow (default: all)"),
+    rows: bool = Query(True, description="Include changed rows, or only ids and counts")
+):
+    """Stream dataset changes as server-sent events"""
+    table_set = set(split_terms(tables))
+    unknown = sorted(table_set - set(PUBLIC_TABLES))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown tables: {', '.join(unknown)}")
+    
+    return StreamingResponse(
+        change_hub.stream(table_set or None, set(split_terms(hospital_id)) or None, rows, request.headers.get("last-event-id")),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/hospitals", tags=["Hospitals"])
 def get_all_hospitals(
+    request: Request,
     city: Optional[str] = Query(None, description="Filter by city"),
     hospital_type: Optional[str] = Query(None, description="Filter by hospital type"),
     min_beds: Optional[int] = Query(None, description="Minimum bed count")
@@ -107,8 +203,8 @@ def get_all_hospitals(
     """Get all hospitals with optional filtering"""
     
     
-    hospitals = load_json_data("hospitals.json")
-    addresses = load_json_data("hospital_addresses.json")
+    hospitals = repo.filter_hospitals(city, hospital_type, min_beds)
+    primary_addresses = repo.primary_addresses()
     
     print(f"✅ Loaded {len(hospitals) if isinstance(hospitals, list) else 'non-list'} hospitals")
     if hospitals:
@@ -118,20 +214,15 @@ def get_all_hospitals(
     else:
         print("❌ No hospitals data loaded!")
     
-    # Ensure we have list data
-    hospitals = get_list_from_data(hospitals)
-    addresses = get_list_from_data(addresses)
-    
     hospital_list = []
     for hospital in hospitals:
         # Skip incomplete hospital records that only have center_of_excellence
         if not hospital.get("name"):
             continue
             
-        primary_address = next(
-            (addr for addr in addresses if str(addr.get("hospital_id")) == str(hospital.get("id")) and addr.get("address_type") == "Primary"),
-            None
-        )
+        primary_address = primary_addresses.get(str(hospital.get("id")))
+        if primary_address and primary_address.get("address_type") != "Primary":
+            primary_address = None
         
         hospital_summary = {
             "id": hospital.get("id"),
@@ -153,14 +244,6 @@ def get_all_hospitals(
             "longitude": hospital.get("longitude")
         }
         
-        # Apply filters
-        if city and (not primary_address or primary_address.get("city_town", "").lower() != city.lower()):
-            continue
-        if hospital_type and hospital.get("hospital_type", "").lower() != hospital_type.lower():
-            continue
-        if min_beds and hospital.get("beds_registered", 0) < min_beds:
-            continue
-            
         hospital_list.append(hospital_summary)
     
     # Debug: Check how many hospitals have coordinates
@@ -171,32 +254,69 @@ def get_all_hospitals(
         sample = hospital_list[0]
         print(f"🏥 First hospital sample: {sample.get('name')} - lat: {sample.get('latitude')}, lng: {sample.get('longitude')}")
     
-    return {
+    return render(request, {
         "count": len(hospital_list),
         "hospitals": hospital_list
+    }, "hospitals")
+
+def split_terms(value: Optional[str]) -> List[str]:
+    """Comma-separated query parameter as a list of non-empty terms"""
+    return [term.strip() for term in (value or "").split(",") if term.strip()]
+
+@app.get("/hospitals/capabilities", tags=["Hospitals"])
+def get_hospitals_by_capability(
+    all_of: Optional[str] = Query(None, alias="all", description="Comma-separated capabilities a hospital must all have, e.g. specialty:Cardiology,equipment:Cath Lab,icu:NICU,service_24x7:Blood Bank"),
+    any_of: Optional[str] = Query(None, alias="any", description="Comma-separated capabilities of which a hospital needs at least one"),
+    none_of: Optional[str] = Query(None, alias="none", description="Comma-separated capabilities a hospital must not have")
+):
+    """Find hospitals by specialty, equipment, ICU and support service capabilities"""
+    criteria = {"all": split_terms(all_of), "any": split_terms(any_of), "none": split_terms(none_of)}
+    result = capability_index(repo).query(criteria["all"], criteria["any"], criteria["none"])
+    if result["unknown"]:
+        raise HTTPException(status_code=400, detail=f"Unknown capabilities: {', '.join(result['unknown'])}. See /hospitals/capabilities/catalog")
+    
+    primary_addresses = repo.primary_addresses()
+    hospitals = []
+    for hospital in result["hospitals"]:
+        primary_address = primary_addresses.get(str(hospital.get("id")), {})
+        hospitals.append({
+            "id": hospital.get("id"),
+            "name": hospital.get("name"),
+            "hospital_type": hospital.get("hospital_type"),
+            "beds_registered": hospital.get("beds_registered"),
+            "city": primary_address.get("city_town"),
+            "state": primary_address.get("state")
+        })
+    
+    return {
+        "criteria": criteria,
+        "count": len(hospitals),
+        "hospitals": hospitals
     }
 
+@app.get("/hospitals/capabilities/catalog", tags=["Hospitals"])
+def get_capability_catalog():
+    """List every known capability with the number of hospitals offering it"""
+    return capability_index(repo).catalog()
+
 @app.get("/hospitals/{hospital_id}", tags=["Hospitals"])
 def get_hospital_details(hospital_id: str):
     """Get complete hospital details"""
-    hospitals = get_list_from_data(load_json_data("hospitals.json"))
-    
-    hospital = next((h for h in hospitals if str(h.get("hospital_id")) == hospital_id or str(h.get("id")) == hospital_id), None)
+    hospital = repo.get_hospital(hospital_id)
     if not hospital:
         raise HTTPException(status_code=404, detail="Hospital not found")
     
     return hospital
 
 @app.get("/hospital_addresses", tags=["Hospitals"])
-def get_all_hospital_addresses():
+def get_all_hospital_addresses(request: Request):
     """Get all hospital addresses"""
-    return load_json_data("hospital_addresses.json")
+    return render(request, repo.all("hospital_addresses"))
 
 @app.get("/hospitals/{hospital_id}/addresses", tags=["Hospitals"])
 def get_hospital_addresses(hospital_id: str):
     """Get hospital addresses"""
-    addresses = get_list_from_data(load_json_data("hospital_addresses.json"))
-    hospital_addresses = [addr for addr in addresses if str(addr.get("hospital_id")) == hospital_id]
+    hospital_addresses = repo.by_hospital("hospital_addresses", hospital_id)
     
     if not hospital_addresses:
         raise HTTPException(status_code=404, detail="No addresses found for hospital")
@@ -210,8 +330,7 @@ def get_hospital_addresses(hospital_id: str):
 @app.get("/hospitals/{hospital_id}/specialties", tags=["Medical"])
 def get_hospital_specialties(hospital_id: str):
     """Get medical specialties for a hospital"""
-    specialties = get_list_from_data(load_json_data("medical_specialties.json"))
-    hospital_specialties = [spec for spec in specialties if str(spec.get("hospital_id")) == hospital_id]
+    hospital_specialties = repo.by_hospital("medical_specialties", hospital_id)
     
     return {
         "hospital_id": hospital_id,
@@ -225,17 +344,12 @@ def get_hospital_doctors(
     specialty: Optional[str] = Query(None, description="Filter by specialty")
 ):
     """Get doctors for a hospital"""
-    doctors = get_list_from_data(load_json_data("doctors.json"))
-    specialties = get_list_from_data(load_json_data("medical_specialties.json"))
+    hospital_doctors = repo.by_hospital("doctors", hospital_id)
+    specialties = {str(spec.get("id")): spec for spec in repo.by_hospital("medical_specialties", hospital_id)}
     
-    hospital_doctors = [doc for doc in doctors if str(doc.get("hospital_id")) == hospital_id]
-    
-    for doctor in hospital_doctors:
-        specialty_info = next(
-            (spec for spec in specialties if str(spec.get("id")) == str(doctor.get("specialty_id"))),
-            None
-        )
-        doctor["specialty_name"] = specialty_info.get("specialty_name") if specialty_info else "Unknown"
+    for i, doctor in enumerate(hospital_doctors):
+        specialty_info = specialties.get(str(doctor.get("specialty_id")))
+        hospital_doctors[i] = dict(doctor, specialty_name=specialty_info.get("specialty_name") if specialty_info else "Unknown")
     
     if specialty:
         hospital_doctors = [doc for doc in hospital_doctors if specialty.lower() in doc.get("specialty_name", "").lower()]
@@ -252,8 +366,7 @@ def get_hospital_equipment(
     category: Optional[str] = Query(None, description="Filter by equipment category")
 ):
     """Get equipment for a hospital"""
-    equipment = get_list_from_data(load_json_data("hospital_equipment.json"))
-    hospital_equipment = [eq for eq in equipment if str(eq.get("hospital_id")) == hospital_id]
+    hospital_equipment = repo.by_hospital("hospital_equipment", hospital_id)
     
     if category:
         hospital_equipment = [eq for eq in hospital_equipment if category.lower() in eq.get("category", "").lower()]
@@ -271,8 +384,7 @@ def get_hospital_equipment(
 @app.get("/hospitals/{hospital_id}/infrastructure", tags=["Infrastructure"])
 def get_hospital_infrastructure(hospital_id: str):
     """Get infrastructure details"""
-    infrastructure = get_list_from_data(load_json_data("hospital_infrastructure.json"))
-    hospital_infra = [infra for infra in infrastructure if str(infra.get("hospital_id")) == hospital_id]
+    hospital_infra = repo.by_hospital("hospital_infrastructure", hospital_id)
     
     return {
         "hospital_id": hospital_id,
@@ -283,8 +395,7 @@ def get_hospital_infrastructure(hospital_id: str):
 @app.get("/hospitals/{hospital_id}/operation-theaters", tags=["Infrastructure"])
 def get_hospital_ots(hospital_id: str):
     """Get operation theater details"""
-    ots = get_list_from_data(load_json_data("operation_theaters.json"))
-    hospital_ots = [ot for ot in ots if str(ot.get("hospital_id")) == hospital_id]
+    hospital_ots = repo.by_hospital("operation_theaters", hospital_id)
     
     return {
         "hospital_id": hospital_id,
@@ -295,8 +406,7 @@ def get_hospital_ots(hospital_id: str):
 @app.get("/hospitals/{hospital_id}/icu-facilities", tags=["Infrastructure"])
 def get_hospital_icus(hospital_id: str):
     """Get ICU facilities"""
-    icus = get_list_from_data(load_json_data("icu_facilities.json"))
-    hospital_icus = [icu for icu in icus if str(icu.get("hospital_id")) == hospital_id]
+    hospital_icus = repo.by_hospital("icu_facilities", hospital_id)
     
     return {
         "hospital_id": hospital_id,
@@ -307,8 +417,7 @@ def get_hospital_icus(hospital_id: str):
 @app.get("/hospitals/{hospital_id}/wards", tags=["Infrastructure"])
 def get_hospital_wards(hospital_id: str):
     """Get ward/room details"""
-    wards = get_list_from_data(load_json_data("wards_rooms.json"))
-    hospital_wards = [ward for ward in wards if str(ward.get("hospital_id")) == hospital_id]
+    hospital_wards = repo.by_hospital("wards_rooms", hospital_id)
     
     return {
         "hospital_id": hospital_id,
@@ -321,15 +430,14 @@ def get_hospital_wards(hospital_id: str):
 # ================================
 
 @app.get("/hospital-contacts", tags=["Contacts"])
-def get_hospital_contacts():
+def get_hospital_contacts(request: Request):
     """Get all hospital contacts"""
-    return load_json_data("hospital_contacts.json")
+    return render(request, repo.all("hospital_contacts"))
 
 @app.get("/hospitals/{hospital_id}/contacts", tags=["Contacts"])
 def get_hospital_contacts_by_id(hospital_id: str):
     """Get contacts for a specific hospital"""
-    contacts = get_list_from_data(load_json_data("hospital_contacts.json"))
-    hospital_contacts = [contact for contact in contacts if str(contact.get("hospital_id")) == hospital_id]
+    hospital_contacts = repo.by_hospital("hospital_contacts", hospital_id)
     
     return {
         "hospital_id": hospital_id,
@@ -344,8 +452,7 @@ def get_hospital_contacts_by_id(hospital_id: str):
 @app.get("/hospitals/{hospital_id}/diagnostic-services", tags=["Services"])
 def get_diagnostic_services(hospital_id: str):
     """Get diagnostic services"""
-    services = get_list_from_data(load_json_data("diagnostic_services.json"))
-    hospital_services = [svc for svc in services if str(svc.get("hospital_id")) == hospital_id]
+    hospital_services = repo.by_hospital("diagnostic_services", hospital_id)
     
     return {
         "hospital_id": hospital_id,
@@ -356,8 +463,7 @@ def get_diagnostic_services(hospital_id: str):
 @app.get("/hospitals/{hospital_id}/support-services", tags=["Services"])
 def get_support_services(hospital_id: str):
     """Get support services (Pharmacy, Blood Bank, etc.)"""
-    services = get_list_from_data(load_json_data("support_services.json"))
-    hospital_services = [svc for svc in services if str(svc.get("hospital_id")) == hospital_id]
+    hospital_services = repo.by_hospital("support_services", hospital_id)
     
     return {
         "hospital_id": hospital_id,
@@ -366,94 +472,126 @@ def get_support_services(hospital_id: str):
     }
 
 @app.get("/hospitals/certifications", tags=["Certifications"])
-def get_all_hospital_certifications():
+def get_all_hospital_certifications(request: Request):
     """Get certifications for all hospitals"""
-    try:
-        # Direct file access to avoid the caching mechanism
-        file_path = os.path.join("data", "hospital_certifications.json")
-        with open(file_path, 'r', encoding='utf-8') as f:
-            certification_data = json.load(f)
-            print(f"✅ Successfully loaded hospital_certifications.json directly")
-            return certification_data  # Return the complete JSON structure with hospitals key
-    except FileNotFoundError:
-        print(f"❌ File not found: hospital_certifications.json")
-        raise HTTPException(status_code=404, detail=f"Certification data not found")
-    except json.JSONDecodeError as e:
-        print(f"❌ JSON decode error in hospital_certifications.json: {e}")
-        raise HTTPException(status_code=500, detail=f"Invalid certification data format")
-    except Exception as e:
-        print(f"❌ Unexpected error loading certifications: {e}")
-        raise HTTPException(status_code=500, detail=f"Error loading certification data")
+    return render(request, repo.all("hospital_certifications"))
 
 
 @app.get("/analytics/hospital-metrics", tags=["Analytics"])
 def get_hospital_metrics_summary():
-    """Get hospital performance metrics summary"""
-    metrics = get_list_from_data(load_json_data("hospital_metrics.json"))
+    """Get hospital performance metrics summary with network-wide monthly trends"""
+    metrics = repo.all("hospital_metrics")
+    capacity = bed_capacity_rollups(repo)["totals"]
+    store = metric_store(repo)
+    
+    def network_average(field: str) -> Optional[float]:
+        values = [m[field] for m in metrics if m.get(field) is not None]
+        return round(sum(values) / len(values), 3) if values else None
+    
+    trend_fields = {"bed_occupancy": "bedOccupancy", "doctor_bed_ratio": "doctorBedRatio", "nurse_bed_ratio": "nurseBedRatio"}
+    monthly = defaultdict(dict)
+    for metric, field in trend_fields.items():
+        for point in store.network_trend(metric, "month"):
+            monthly[point["period"]][field] = point["avg"]
     
     return {
         "currentMetrics": {
-            "financial": {"revenue": 45000000, "operatingMargin": 12.5, "costPerPatient": 8500, "target": {"revenue": 48000000, "operatingMargin": 15.0, "costPerPatient": 8000}},
-            "quality": {"patientSatisfaction": 85, "readmissionRate": 8.2, "safetyRating": "A", "target": {"patientSatisfaction": 90, "readmissionRate": 7.0, "safetyRating": "A+"}},
-            "operational": {"bedOccupancy": 78, "avgLengthOfStay": 4.2, "nursePatientRatio": 1.4, "target": {"bedOccupancy": 85, "avgLengthOfStay": 3.8, "nursePatientRatio": 1.2}}
+            "operational": {"bedOccupancy": capacity["occupancy_rate"], "availableBeds": capacity["available_beds"], "totalBeds": capacity["total_beds"]},
+            "staffing": {field: network_average(metric) for metric, field in trend_fields.items() if metric != "bed_occupancy"}
         },
-        "monthlyTrends": [
-            {"month": "Jan", "revenue": 4200000, "satisfaction": 82, "bedOccupancy": 75, "operatingMargin": 11.2},
-            {"month": "Feb", "revenue": 3900000, "satisfaction": 84, "bedOccupancy": 73, "operatingMargin": 10.8},
-            {"month": "Mar", "revenue": 4100000, "satisfaction": 83, "bedOccupancy": 76, "operatingMargin": 11.5},
-            {"month": "Apr", "revenue": 3800000, "satisfaction": 85, "bedOccupancy": 74, "operatingMargin": 10.9},
-            {"month": "May", "revenue": 4300000, "satisfaction": 86, "bedOccupancy": 79, "operatingMargin": 12.1},
-            {"month": "Jun", "revenue": 4500000, "satisfaction": 87, "bedOccupancy": 81, "operatingMargin": 12.8},
-            {"month": "Jul", "revenue": 4600000, "satisfaction": 85, "bedOccupancy": 80, "operatingMargin": 13.2},
-            {"month": "Aug", "revenue": 4400000, "satisfaction": 84, "bedOccupancy": 78, "operatingMargin": 12.5},
-            {"month": "Sep", "revenue": 4200000, "satisfaction": 86, "bedOccupancy": 77, "operatingMargin": 12.0},
-            {"month": "Oct", "revenue": 4700000, "satisfaction": 88, "bedOccupancy": 82, "operatingMargin": 13.5},
-            {"month": "Nov", "revenue": 4800000, "satisfaction": 87, "bedOccupancy": 83, "operatingMargin": 13.8},
-            {"month": "Dec", "revenue": 4900000, "satisfaction": 85, "bedOccupancy": 78, "operatingMargin": 12.5}
-        ],
+        "monthlyTrends": [{"month": month, **values} for month, values in sorted(monthly.items())],
         "metrics": metrics
     }
 
+@app.get("/analytics/metric-trends", tags=["Analytics"])
+def get_metric_trends(
+    metric: str = Query(..., description=f"One of {', '.join(SERIES_METRICS)}"),
+    granularity: str = Query("month", description="day or month"),
+    start: Optional[str] = Query(None, description="Earliest date (YYYY-MM-DD), inclusive"),
+    end: Optional[str] = Query(None, description="Latest date (YYYY-MM-DD), inclusive")
+):
+    """Get a network-wide trend of a hospital metric from the time-series rollups"""
+    try:
+        trend = metric_store(repo).network_trend(metric, granularity, parse_date_param(start, "start"), parse_date_param(end, "end"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "metric": metric,
+        "granularity": granularity,
+        "total_periods": len(trend),
+        "trend": trend
+    }
+
+@app.get("/metrics/series", tags=["Analytics"])
+def get_metric_series(
+    metric: str = Query(..., description=f"One of {', '.join(SERIES_METRICS)}"),
+    hospital_id: Optional[str] = Query(None, description="Comma-separated hospital ids (default: all)"),
+    granularity: str = Query("month", description="raw, day or month"),
+    start: Optional[str] = Query(None, description="Earliest date (YYYY-MM-DD), inclusive"),
+    end: Optional[str] = Query(None, description="Latest date (YYYY-MM-DD), inclusive")
+):
+    """Get per-hospital time series of a metric as raw points or daily/monthly rollups"""
+    try:
+        series = metric_store(repo).hospital_series(
+            metric, split_terms(hospital_id) or None, granularity, parse_date_param(start, "start"), parse_date_param(end, "end")
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "metric": metric,
+        "granularity": granularity,
+        "total_hospitals": len(series),
+        "hospitals": series
+    }
+
 @app.get("/document-verification", tags=["Documents"])
-def get_document_verification():
-    """Get document verification data"""
-    uploads_data = load_json_data("document_uploads.json")
+def get_document_verification(
+    include_documents: bool = Query(False, description="Also return every upload row")
+):
+    """Get precomputed document verification counters"""
+    index = document_index(repo)
+    result = index.summary()
+    if include_documents:
+        result["documents"] = index.rows
     
-    # Ensure we have a list of uploads
-    if isinstance(uploads_data, dict) and "documents" in uploads_data:
-        uploads = uploads_data["documents"]
-    else:
-        uploads = get_list_from_data(uploads_data)
-    
-    # Count documents by status
-    verified = 0
-    pending = 0
-    rejected = 0
-    
-    for doc in uploads:
-        status = doc.get("status", "").lower()
-        if status == "verified":
-            verified += 1
-        elif status == "pending":
-            pending += 1
-        elif status == "rejected":
-            rejected += 1
+    return result
+
+@app.get("/documents", tags=["Documents"])
+def query_documents(
+    entity_type: Optional[str] = Query(None, description="Filter by entity type, e.g. hospital"),
+    entity_id: Optional[str] = Query(None, description="Filter by entity id"),
+    document_type: Optional[str] = Query(None, description="Filter by document type, e.g. Fire NOC"),
+    state: Optional[str] = Query(None, description="Filter by verification state: verified, pending or rejected"),
+    uploaded_from: Optional[str] = Query(None, description="Earliest upload date (YYYY-MM-DD), inclusive"),
+    uploaded_to: Optional[str] = Query(None, description="Latest upload date (YYYY-MM-DD), inclusive"),
+    page: int = Query(1, ge=1, description="Page number"),
+    page_size: int = Query(50, ge=1, le=500, description="Documents per page")
+):
+    """Get a page of document uploads matching the filters"""
+    if state and state.lower() not in VERIFICATION_STATES:
+        raise HTTPException(status_code=400, detail=f"state must be one of {', '.join(VERIFICATION_STATES)}")
+    
+    matches = document_index(repo).query(
+        {"entity_type": entity_type, "entity_id": entity_id, "document_type": document_type, "verification_state": state},
+        parse_date_param(uploaded_from, "uploaded_from"),
+        parse_date_param(uploaded_to, "uploaded_to")
+    )
+    offset = (page - 1) * page_size
     
     return {
-        "total": len(uploads),
-        "verified": verified,
-        "pending": pending,
-        "rejected": rejected,
-        "documents": uploads
+        "total": len(matches),
+        "page": page,
+        "page_size": page_size,
+        "documents": matches[offset:offset + page_size]
     }
 
 @app.get("/hospitals/{hospital_id}/certifications", tags=["Certifications"])
 def get_hospital_certifications(hospital_id: str):
     """Get certifications (NABH, ISO, JCI)"""
-    certifications = get_list_from_data(load_json_data("hospital_certifications.json"))
-    
     # Find the hospital and its certifications
-    hospital_certs_data = next((h for h in certifications if str(h.get("hospital_id")) == hospital_id), None)
+    hospital_certs_data = next(iter(repo.by_hospital("hospital_certifications", hospital_id)), None)
     
     if not hospital_certs_data:
         raise HTTPException(status_code=404, detail="Certifications not found for hospital")
@@ -470,8 +608,7 @@ def get_hospital_certifications(hospital_id: str):
 @app.get("/hospitals/{hospital_id}/compliance", tags=["Quality"])
 def get_compliance_licenses(hospital_id: str):
     """Get compliance licenses"""
-    licenses = get_list_from_data(load_json_data("compliance_licenses.json"))
-    hospital_licenses = [lic for lic in licenses if str(lic.get("hospital_id")) == hospital_id]
+    hospital_licenses = repo.by_hospital("compliance_licenses", hospital_id)
     
     return {
         "hospital_id": hospital_id,
@@ -479,11 +616,75 @@ def get_compliance_licenses(hospital_id: str):
         "compliance_licenses": hospital_licenses
     }
 
+def expiry_sources(source: str) -> List[str]:
+    """Expand the source query parameter to index names"""
+    if source == "all":
+        return list(EXPIRY_SOURCES)
+    if source not in EXPIRY_SOURCES:
+        raise HTTPException(status_code=400, detail="source must be certifications, licenses or all")
+    return [source]
+
+@app.get("/compliance/expiring", tags=["Quality"])
+def get_expiring_compliance(
+    start: Optional[str] = Query(None, description="Earliest expiry date (YYYY-MM-DD), inclusive"),
+    end: Optional[str] = Query(None, description="Latest expiry date (YYYY-MM-DD), inclusive"),
+    source: str = Query("all", description="certifications, licenses or all"),
+    item_type: Optional[str] = Query(None, alias="type", description="Certification or license type, e.g. NABH or Fire NOC")
+):
+    """Get certifications and licenses expiring between two dates"""
+    start, end = parse_date_param(start, "start"), parse_date_param(end, "end")
+    
+    result = {"start": start, "end": end, "type": item_type}
+    for name in expiry_sources(source):
+        index = expiry_index(repo, name).index_for(item_type)
+        rows = index.between(start, end) if index else []
+        result[name] = {"count": len(rows), "items": rows}
+    
+    return result
+
+@app.get("/compliance/lapsed", tags=["Quality"])
+def get_lapsed_compliance(
+    as_of: Optional[str] = Query(None, description="Reference date (YYYY-MM-DD), defaults to today"),
+    source: str = Query("all", description="certifications, licenses or all"),
+    item_type: Optional[str] = Query(None, alias="type", description="Certification or license type")
+):
+    """Get certifications and licenses that expired before a date"""
+    as_of = parse_date_param(as_of, "as_of") or date.today().isoformat()
+    
+    result = {"as_of": as_of, "type": item_type}
+    for name in expiry_sources(source):
+        index = expiry_index(repo, name).index_for(item_type)
+        rows = index.before(as_of) if index else []
+        result[name] = {"count": len(rows), "items": rows}
+    
+    return result
+
+@app.get("/compliance/expiry-by-month", tags=["Quality"])
+def get_expiry_by_month(
+    start: Optional[str] = Query(None, description="Earliest expiry date (YYYY-MM-DD), inclusive"),
+    end: Optional[str] = Query(None, description="Latest expiry date (YYYY-MM-DD), inclusive"),
+    source: str = Query("all", description="certifications, licenses or all")
+):
+    """Get expiry counts per certification/license type and month"""
+    start, end = parse_date_param(start, "start"), parse_date_param(end, "end")
+    
+    result = {"start": start, "end": end}
+    for name in expiry_sources(source):
+        index = expiry_index(repo, name)
+        result[name] = {
+            str(row_type): {
+                "total": type_index.count_between(start, end),
+                "by_month": type_index.month_counts(start, end)
+            }
+            for row_type, type_index in index.by_type.items()
+        }
+    
+    return result
+
 @app.get("/hospitals/{hospital_id}/metrics", tags=["Analytics"])
 def get_hospital_metrics(hospital_id: str):
     """Get hospital performance metrics"""
-    metrics = get_list_from_data(load_json_data("hospital_metrics.json"))
-    hospital_metric = next((m for m in metrics if str(m.get("hospital_id")) == hospital_id), None)
+    hospital_metric = next(iter(repo.by_hospital("hospital_metrics", hospital_id)), None)
     
     if not hospital_metric:
         raise HTTPException(status_code=404, detail="Metrics not found for hospital")
@@ -500,39 +701,16 @@ def search_hospitals(
     limit: int = Query(10, description="Maximum results")
 ):
     """Search hospitals by name, city, or specialty"""
-    hospitals = get_list_from_data(load_json_data("hospitals.json"))
-    addresses = get_list_from_data(load_json_data("hospital_addresses.json"))
-    
-    results = []
-    query_lower = q.lower()
-    
-    for hospital in hospitals:
-        hospital_id = str(hospital.get("hospital_id", hospital.get("id")))
-        
-        if query_lower in hospital.get("name", "").lower():
-            primary_address = next((addr for addr in addresses if str(addr.get("hospital_id")) == hospital_id and addr.get("address_type") == "Primary"), {})
-            results.append({
-                "hospital_id": hospital_id,
-                "name": hospital.get("name"),
-                "hospital_type": hospital.get("type"),
-                "city": primary_address.get("city_town"),
-                "match_type": "name"
-            })
-        
-        hospital_addresses = [addr for addr in addresses if str(addr.get("hospital_id")) == hospital_id]
-        for addr in hospital_addresses:
-            if addr.get("city_town") and query_lower in addr["city_town"].lower():
-                results.append({
-                    "hospital_id": hospital_id,
-                    "name": hospital.get("name"),
-                    "hospital_type": hospital.get("type"),
-                    "city": addr.get("city_town"),
-                    "match_type": "city"
-                })
-                break
-    
-    seen = set()
-    unique_results = [r for r in results if r['hospital_id'] not in seen and not seen.add(r['hospital_id'])]
+    unique_results = [
+        {
+            "hospital_id": str(hospital.get("hospital_id", hospital.get("id"))),
+            "name": hospital.get("name"),
+            "hospital_type": hospital.get("type"),
+            "city": city,
+            "match_type": match_type
+        }
+        for hospital, city, match_type in repo.search_hospitals(q)
+    ]
     
     return {
         "query": q,
@@ -543,101 +721,47 @@ def search_hospitals(
 @app.get("/analytics/summary", tags=["Analytics"])
 def get_analytics_summary():
     """Get overall analytics summary"""
-    hospitals_data = load_json_data("hospitals.json")
-    doctors_data = load_json_data("doctors.json")
-    equipment_data = load_json_data("hospital_equipment.json")
-    certifications_data = load_json_data("hospital_certifications.json")
-    
-    # Extract hospitals list
-    if isinstance(hospitals_data, dict) and "hospitals" in hospitals_data:
-        hospitals = hospitals_data["hospitals"]
-    else:
-        hospitals = get_list_from_data(hospitals_data)
+    overview = repo.hospital_overview()
+    doctor_count = sum(repo.group_count("doctors", "hospital_id").values())
+    equipment_count = sum(repo.group_count("hospital_equipment", "hospital_id").values())
     
-    # Extract doctors list
-    doctors = get_list_from_data(doctors_data)
+    # Count unique certified hospitals
+    cert_count = len([hospital_id for hospital_id in repo.group_count("hospital_certifications", "hospital_id") if hospital_id is not None])
     
-    # Extract equipment list
-    equipment = get_list_from_data(equipment_data)
-    
-    # Extract certifications list and count unique hospitals
-    if isinstance(certifications_data, dict) and "hospitals" in certifications_data:
-        cert_hospitals = set()
-        for hospital in certifications_data["hospitals"]:
-            if "hospital_id" in hospital:
-                cert_hospitals.add(str(hospital["hospital_id"]))
-        cert_count = len(cert_hospitals)
-    else:
-        cert_count = len(set(str(cert.get("hospital_id", "")) for cert in get_list_from_data(certifications_data) if "hospital_id" in cert))
-    
-    # Get hospital types and beds
-    hospital_types = []
-    total_beds = 0
-    count_with_beds = 0
-    
-    for h in hospitals:
-        # Extract hospital type
-        if "type" in h:
-            hospital_types.append(h["type"])
-        elif "hospital_type" in h:
-            hospital_types.append(h["hospital_type"])
-        
-        # Extract bed count
-        if "beds" in h:
-            total_beds += int(h["beds"])
-            count_with_beds += 1
-        elif "beds_registered" in h:
-            total_beds += int(h["beds_registered"])
-            count_with_beds += 1
-    
-    avg_beds = round(total_beds / count_with_beds, 1) if count_with_beds > 0 else 0
+    avg_beds = round(overview["bed_total"] / overview["bed_count"], 1) if overview["bed_count"] > 0 else 0
     
     return {
-        "total_hospitals": len(hospitals),
-        "total_doctors": len(doctors),
-        "total_equipment": len(equipment),
+        "total_hospitals": overview["hospital_count"],
+        "total_doctors": doctor_count,
+        "total_equipment": equipment_count,
         "certified_hospitals": cert_count,
-        "hospital_types": list(set(hospital_types)),
+        "hospital_types": overview["types"],
         "average_beds": avg_beds
     }
 
 @app.get("/analytics/hospitals-by-state", tags=["Analytics"])
+@coalesced("/analytics/hospitals-by-state")
 def get_hospitals_by_state():
     """Get hospital distribution by state with bed totals"""
-    hospitals = get_list_from_data(load_json_data("hospitals.json"))
-    addresses = get_list_from_data(load_json_data("hospital_addresses.json"))
-    
-    state_data = defaultdict(lambda: {"hospital_count": 0, "total_beds": 0, "operational_beds": 0, "hospitals": []})
-    
-    for hospital in hospitals:
-        hospital_id = str(hospital.get("hospital_id", hospital.get("id")))
-        primary_address = next((addr for addr in addresses if str(addr.get("hospital_id")) == hospital_id), None)
-        
-        if primary_address and primary_address.get("state"):
-            state = primary_address["state"]
-            beds = int(hospital.get("beds", hospital.get("beds_registered", 0)))
-            
-            state_data[state]["hospital_count"] += 1
-            state_data[state]["total_beds"] += beds
-            state_data[state]["operational_beds"] += int(beds * 0.85)
-            state_data[state]["hospitals"].append({
-                "id": hospital_id,
-                "name": hospital.get("name"),
-                "type": hospital.get("type", hospital.get("hospital_type")),
-                "beds": beds,
-                "city": primary_address.get("city_town")
-            })
-    
     result = [
         {
-            "state": state,
+            "state": data["state"],
             "hospital_count": data["hospital_count"],
             "total_beds": data["total_beds"],
             "operational_beds": data["operational_beds"],
             "bed_utilization": round((data["operational_beds"] / data["total_beds"]) * 100, 2) if data["total_beds"] > 0 else 0,
-            "hospitals": data["hospitals"]
+            "hospitals": [
+                {
+                    "id": str(hospital.get("hospital_id", hospital.get("id"))),
+                    "name": hospital.get("name"),
+                    "type": hospital.get("type", hospital.get("hospital_type")),
+                    "beds": beds,
+                    "city": city
+                }
+                for hospital, city, beds in data["hospitals"]
+            ]
         }
-        for state, data in state_data.items()
+        for data in repo.state_distribution()
     ]
     
     return {
@@ -646,15 +770,15 @@ def get_hospitals_by_state():
     }
 
 @app.get("/analytics/geographic-distribution", tags=["Analytics"])
-def get_geographic_distribution():
+def get_geographic_distribution(request: Request):
     """Get hospitals with geographic coordinates for mapping"""
-    hospitals = get_list_from_data(load_json_data("hospitals.json"))
-    addresses = get_list_from_data(load_json_data("hospital_addresses.json"))
+    hospitals = repo.all("hospitals")
+    primary_addresses = repo.primary_addresses()
     
     geo_data = []
     for hospital in hospitals:
         hospital_id = str(hospital.get("hospital_id", hospital.get("id")))
-        primary_address = next((addr for addr in addresses if str(addr.get("hospital_id")) == hospital_id and addr.get("address_type") == "Primary"), None)
+        primary_address = primary_addresses.get(hospital_id)
         
         geo_data.append({
             "id": hospital_id,
@@ -669,26 +793,29 @@ def get_geographic_distribution():
             "address": primary_address.get("street") if primary_address else None
         })
     
-    return {
+    return render(request, {
         "total_hospitals": len(geo_data),
         "hospitals": geo_data
-    }
+    }, "hospitals")
 
 @app.get("/analytics/hospital-rankings", tags=["Analytics"])
 def get_hospital_rankings(
+    request: Request,
     metric: str = Query("doctor_bed_ratio", description="Ranking metric: doctor_bed_ratio, nurse_bed_ratio, beds_registered"),
     limit: int = Query(20, description="Number of results")
 ):
     """Get ranked hospitals by specified metric"""
-    hospitals = get_list_from_data(load_json_data("hospitals.json"))
-    metrics = get_list_from_data(load_json_data("hospital_metrics.json"))
-    addresses = get_list_from_data(load_json_data("hospital_addresses.json"))
+    hospitals = repo.all("hospitals")
+    metrics_by_hospital = {}
+    for m in repo.all("hospital_metrics"):
+        metrics_by_hospital.setdefault(str(m.get("hospital_id")), m)
+    primary_addresses = repo.primary_addresses()
     
     ranking_data = []
     for hospital in hospitals:
         hospital_id = str(hospital.get("hospital_id", hospital.get("id")))
-        hospital_metric = next((m for m in metrics if str(m.get("hospital_id")) == hospital_id), None)
-        primary_address = next((addr for addr in addresses if str(addr.get("hospital_id")) == hospital_id and addr.get("address_type") == "Primary"), None)
+        hospital_metric = metrics_by_hospital.get(hospital_id)
+        primary_address = primary_addresses.get(hospital_id)
         
         ranking_value = 0
         if metric == "beds_registered":
@@ -716,18 +843,17 @@ def get_hospital_rankings(
     for i, item in enumerate(ranking_data):
         item["rank"] = i + 1
     
-    return {
+    return render(request, {
         "metric": metric,
         "total_hospitals": len(ranking_data),
         "rankings": ranking_data[:limit]
-    }
+    }, "rankings")
 
 @app.get("/analytics/benchmarks", tags=["Analytics"])
 def get_network_benchmarks():
     """Get network-wide benchmark statistics"""
-    hospitals = get_list_from_data(load_json_data("hospitals.json"))
-    metrics = get_list_from_data(load_json_data("hospital_metrics.json"))
-    certifications = get_list_from_data(load_json_data("hospital_certifications.json"))
+    hospitals = repo.all("hospitals")
+    metrics = repo.all("hospital_metrics")
     
     total_hospitals = len(hospitals)
     total_beds = sum(int(h.get("beds_registered", 0)) for h in hospitals)
@@ -735,7 +861,7 @@ def get_network_benchmarks():
     doctor_ratios = [m.get("doctor_bed_ratio", 0) for m in metrics if m.get("doctor_bed_ratio")]
     nurse_ratios = [m.get("nurse_bed_ratio", 0) for m in metrics if m.get("nurse_bed_ratio")]
     
-    certified_hospitals = len(set(str(cert.get("hospital_id")) for cert in certifications))
+    certified_hospitals = len(repo.group_count("hospital_certifications", "hospital_id"))
     certification_coverage = (certified_hospitals / total_hospitals) * 100 if total_hospitals > 0 else 0
     
     return {
@@ -752,111 +878,76 @@ def get_network_benchmarks():
     }
 
 @app.get("/analytics/equipment-matrix", tags=["Analytics"])
+@coalesced("/analytics/equipment-matrix")
 def get_equipment_matrix(
     equipment_type: str = Query(None, description="Filter by specific equipment type")
 ):
     """Get equipment availability matrix across hospitals"""
-    hospitals = get_list_from_data(load_json_data("hospitals.json"))
-    equipment = get_list_from_data(load_json_data("hospital_equipment.json"))
-    addresses = get_list_from_data(load_json_data("hospital_addresses.json"))
-    
-    if equipment_type:
-        equipment = [eq for eq in equipment if equipment_type.lower() in eq.get("equipment_name", "").lower()]
+    hospitals, equipment_type_count, category_summary = repo.equipment_by_hospital(equipment_type)
     
     equipment_matrix = []
-    for hospital in hospitals:
-        hospital_id = str(hospital.get("hospital_id", hospital.get("id")))
-        primary_address = next((addr for addr in addresses if str(addr.get("hospital_id")) == hospital_id), None)
-        hospital_equipment = [eq for eq in equipment if str(eq.get("hospital_id")) == hospital_id]
-        
-        equipment_by_category = defaultdict(list)
-        for eq in hospital_equipment:
-            category = eq.get("category", "Uncategorized")
-            equipment_by_category[category].append({
-                "name": eq.get("equipment_name"), "brand": eq.get("brand_model"),
-                "quantity": eq.get("quantity"), "available": eq.get("is_available")
-            })
-        
+    for entry in hospitals:
+        hospital = entry["hospital"]
         equipment_matrix.append({
-            "hospital_id": hospital_id,
+            "hospital_id": str(hospital.get("hospital_id", hospital.get("id"))),
             "hospital_name": hospital.get("name"),
             "hospital_type": hospital.get("type"),
-            "city": primary_address.get("city_town") if primary_address else None,
-            "state": primary_address.get("state") if primary_address else None,
-            "total_equipment": len(hospital_equipment),
-            "equipment_by_category": equipment_by_category,
-            "available_equipment_count": sum(1 for eq in hospital_equipment if eq.get("is_available"))
+            "city": entry["city"],
+            "state": entry["state"],
+            "total_equipment": entry["total"],
+            "equipment_by_category": {
+                category: [
+                    {
+                        "name": eq.get("equipment_name"), "brand": eq.get("brand_model"),
+                        "quantity": eq.get("quantity"), "available": eq.get("is_available")
+                    }
+                    for eq in rows
+                ]
+                for category, rows in entry["categories"].items()
+            },
+            "available_equipment_count": entry["available"]
         })
-    
-    all_equipment_types = set(eq.get("equipment_name") for eq in equipment)
-    category_summary = defaultdict(int)
-    for eq in equipment:
-        category_summary[eq.get("category")] += 1
         
     return {
         "filter": equipment_type,
         "total_hospitals": len(equipment_matrix),
-        "total_equipment_types": len(all_equipment_types),
+        "total_equipment_types": equipment_type_count,
         "equipment_categories": category_summary,
         "hospitals": equipment_matrix
     }
 
 @app.get("/analytics/specialty-coverage", tags=["Analytics"])
+@coalesced("/analytics/specialty-coverage")
 def get_specialty_coverage(
     specialty_name: str = Query(None, description="Filter by specific specialty")
 ):
     """Get specialty coverage matrix across cities and hospitals"""
-    hospitals = get_list_from_data(load_json_data("hospitals.json"))
-    specialties = get_list_from_data(load_json_data("medical_specialties.json"))
-    addresses = get_list_from_data(load_json_data("hospital_addresses.json"))
-    
-    if specialty_name:
-        specialties = [spec for spec in specialties if specialty_name.lower() in spec.get("specialty_name", "").lower()]
+    city_coverage, specialty_coverage = repo.specialty_coverage(specialty_name)
     
-    city_coverage = defaultdict(lambda: {"hospitals": [], "specialties": set()})
-    specialty_coverage = defaultdict(lambda: {"cities": set(), "hospitals": []})
-
-    for hospital in hospitals:
-        hospital_id = str(hospital.get("hospital_id", hospital.get("id")))
-        primary_address = next((addr for addr in addresses if str(addr.get("hospital_id")) == hospital_id), None)
-        
-        if not primary_address: continue
-        
-        city = primary_address.get("city_town", "Unknown")
-        hospital_specialties = [spec for spec in specialties if str(spec.get("hospital_id")) == hospital_id]
-        
-        city_coverage[city]["hospitals"].append({"id": hospital_id, "name": hospital.get("name"), "type": hospital.get("type"), "specialty_count": len(hospital_specialties)})
-        
-        for spec in hospital_specialties:
-            specialty = spec.get("specialty_name")
-            city_coverage[city]["specialties"].add(specialty)
-            specialty_coverage[specialty]["cities"].add(city)
-            specialty_coverage[specialty]["hospitals"].append({
-                "hospital_id": hospital["id"],
-                "hospital_name": hospital["name"],
-                "city": city
-            })
-            specialty_coverage[specialty]["total_availability"] += 1
-    
-    # Convert sets to lists and counts
     city_matrix = []
-    for city, data in city_coverage.items():
+    for data in city_coverage:
         city_matrix.append({
-            "city": city,
+            "city": data["city"],
             "hospital_count": len(data["hospitals"]),
             "specialty_count": len(data["specialties"]),
-            "hospitals": data["hospitals"],
-            "available_specialties": list(data["specialties"])
+            "hospitals": [
+                {"id": str(hospital.get("hospital_id", hospital.get("id"))), "name": hospital.get("name"), "type": hospital.get("type"), "specialty_count": count}
+                for hospital, count in data["hospitals"]
+            ],
+            "available_specialties": data["specialties"]
         })
     
     specialty_matrix = []
-    for specialty, data in specialty_coverage.items():
+    for data in specialty_coverage:
         specialty_matrix.append({
-            "specialty_name": specialty,
+            "specialty_name": data["specialty_name"],
             "city_count": len(data["cities"]),
             "hospital_count": len(data["hospitals"]),
-            "cities": list(data["cities"]),
-            "hospitals": data["hospitals"]
+            "cities": data["cities"],
+            "hospitals": [
+                {"hospital_id": hospital_id, "hospital_name": name, "city": city}
+                for hospital_id, name, city in data["hospitals"]
+            ]
         })
     
     return {
@@ -867,89 +958,236 @@ def get_specialty_coverage(
         "specialty_coverage": sorted(specialty_matrix, key=lambda x: x["hospital_count"], reverse=True)
     }
 
+@app.get("/analytics/bed-capacity", tags=["Analytics"])
+def get_bed_capacity(
+    group_by: Optional[str] = Query(None, description="Rollup to return: hospital, ward_type, room_category, city, state or hospital_ward_type (default: all)")
+):
+    """Get precomputed bed capacity and ward occupancy rollups"""
+    if group_by and group_by not in BED_CAPACITY_GROUPS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(BED_CAPACITY_GROUPS)}")
+    
+    capacity = bed_capacity_rollups(repo)
+    rollups = {group_by: capacity["rollups"][group_by]} if group_by else capacity["rollups"]
+    
+    return {
+        "dataset_version": repo.version(),
+        "totals": capacity["totals"],
+        "rollups": rollups
+    }
+
+@app.get("/analytics/hospital-scores", tags=["Analytics"])
+def get_hospital_scores(
+    request: Request,
+    weights: Optional[str] = Query(None, description="Component weights as component:weight pairs, e.g. staffing:2,compliance:0.5"),
+    sort_by: str = Query("composite", description="composite or a component: infrastructure, critical_care, equipment, staffing, compliance"),
+    tier: Optional[int] = Query(None, ge=1, le=4, description="Only hospitals in this tier"),
+    as_of: Optional[str] = Query(None, description="Reference date for equipment age and compliance (YYYY-MM-DD), defaults to today"),
+    limit: int = Query(100, ge=1, description="Number of results")
+):
+    """Get ranked composite hospital scores (tier, infrastructure, risk, modernization)"""
+    try:
+        weight_set = parse_weights(weights)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if sort_by != "composite" and sort_by not in COMPONENT_FEATURES:
+        raise HTTPException(status_code=400, detail=f"sort_by must be composite or one of {', '.join(COMPONENT_FEATURES)}")
+    
+    scores = hospital_scores(repo, weight_set, parse_date_param(as_of, "as_of"))
+    if sort_by != "composite":
+        scores = sorted(scores, key=lambda s: s["components"][sort_by], reverse=True)
+    if tier:
+        scores = [s for s in scores if s["tier"] == tier]
+    
+    return render(request, {
+        "weights": weight_set,
+        "sort_by": sort_by,
+        "total_hospitals": len(scores),
+        "scores": scores[:limit]
+    }, "scores")
+
 # ================================
 # ADDITIONAL ENDPOINTS
 # ================================
 
+# ================================
+# INCREMENTAL SYNC
+# ================================
+
+@app.get("/sync/{table}", tags=["Sync"])
+def sync_table(
+    request: Request,
+    table: str,
+    since: Optional[str] = Query(None, description="Cursor from a previous sync: a dataset version or ISO timestamp (omit for a full sync)")
+):
+    """Get rows changed or deleted since a cursor for incremental replication"""
+    if table not in PUBLIC_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table {table}")
+    
+    log = sync_log()
+    version = repo.version()
+    log.mark_version(version, lambda: global_watermark(repo))
+    index = sync_index(repo, table)
+    
+    if since is None:
+        records, deleted, latest_tombstone, cursor = index.rows, [], 0, 0
+    else:
+        cursor = log.version_mark(since)
+        if cursor is None:
+            cursor = to_micros(since)
+        if cursor is None:
+            raise HTTPException(status_code=410, detail="Unknown or expired cursor, run a full sync without since")
+        if cursor < log.horizon:
+            raise HTTPException(status_code=410, detail=f"Cursor predates the tombstone history ({from_micros(log.horizon)}), run a full sync without since")
+        records = index.since(cursor)
+        deleted, latest_tombstone = log.deleted_since(table, cursor)
+    
+    return render(request, {
+        "table": table,
+        "version": version,
+        "since": since,
+        "full_sync": since is None,
+        # Never behind the tombstone horizon, deletes after it are all on record
+        "cursor": from_micros(max(cursor, index.watermark, latest_tombstone, log.horizon)),
+        "total_changed": len(records),
+        "total_deleted": len(deleted),
+        "deleted": deleted,
+        "records": records
+    }, "records")
+
+# ================================
+# PROVIDER MATCHING
+# ================================
+
+MAX_MATCH_REFERENCES = 10000
+
+class ProviderReference(BaseModel):
+    """Provider as referenced on an incoming claim; ids and codes may arrive as numbers"""
+    reference_id: Optional[Union[StrictStr, StrictInt]] = None
+    provider_code: Optional[Union[StrictStr, StrictInt]] = None
+    registration_number: Optional[Union[StrictStr, StrictInt]] = None
+    name: Optional[str] = None
+    pin_code: Optional[Union[StrictStr, StrictInt]] = None
+    city: Optional[str] = None
+
+class ProviderMatchRequest(BaseModel):
+    references: List[ProviderReference]
+    min_confidence: float = 0.6
+    candidates: int = 3
+
+@app.post("/providers/match", tags=["Providers"])
+def match_providers(batch: ProviderMatchRequest):
+    """Resolve a batch of provider references to hospitals with confidence scores"""
+    if len(batch.references) > MAX_MATCH_REFERENCES:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_MATCH_REFERENCES} references")
+    if not 0 <= batch.min_confidence <= 1:
+        raise HTTPException(status_code=400, detail="min_confidence must be between 0 and 1")
+    if not 1 <= batch.candidates <= 20:
+        raise HTTPException(status_code=400, detail="candidates must be between 1 and 20")
+    
+    index = provider_index(repo)
+    results = [
+        index.match({field: str(value) for field, value in vars(reference).items() if value is not None}, batch.min_confidence, batch.candidates)
+        for reference in batch.references
+    ]
+    status_counts = defaultdict(int)
+    for result in results:
+        status_counts[result["status"]] += 1
+    
+    return {
+        "total_references": len(results),
+        "status_counts": status_counts,
+        "results": results
+    }
+
+# ================================
+# WRITE ENDPOINTS
+# ================================
+
+MAX_WRITE_ROWS = 10000
+
+class TableChanges(BaseModel):
+    """Rows to insert or update (matched on id) and row ids to delete"""
+    upsert: List[Dict[str, Any]] = []
+    delete: List[Union[StrictInt, StrictStr]] = []
+
+async def apply_changes(changes: Dict[str, TableChanges]) -> Dict[str, Any]:
+    """Commit a write batch through the snapshot writer and wait until it is live"""
+    if not isinstance(repo, SnapshotRepository):
+        raise HTTPException(status_code=409, detail="Writes need the in-memory storage engine (DATA_ENGINE=memory)")
+    for table in changes:
+        if table not in PUBLIC_TABLES:
+            raise HTTPException(status_code=404, detail=f"Unknown table {table}")
+    total_rows = sum(len(c.upsert) + len(c.delete) for c in changes.values())
+    if total_rows == 0:
+        raise HTTPException(status_code=400, detail="Batch contains no changes")
+    if total_rows > MAX_WRITE_ROWS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_WRITE_ROWS} rows")
+    
+    future = repo.submit({table: {"upsert": c.upsert, "delete": c.delete} for table, c in changes.items()})
+    try:
+        return await asyncio.wrap_future(future)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/bulk", tags=["Write"])
+async def bulk_write(changes: Dict[str, TableChanges]):
+    """Apply inserts, updates and deletes across several tables as one atomic batch"""
+    return await apply_changes(changes)
+
+@app.post("/bulk/{table}", tags=["Write"])
+async def bulk_write_table(table: str, changes: TableChanges):
+    """Apply inserts, updates and deletes to one table (e.g. hospitals, wards_rooms)"""
+    return await apply_changes({table: changes})
+
 @app.get("/document_uploads", tags=["Documents"])
-def get_document_uploads():
+def get_document_uploads(request: Request):
     """Get all document uploads"""
-    return load_json_data("document_uploads.json")
+    return render(request, repo.all("document_uploads"))
 
 @app.get("/hospital_contacts", tags=["Contacts"])
-def get_hospital_contacts():
+def get_hospital_contacts(request: Request):
     """Get all hospital contacts"""
-    return load_json_data("hospital_contacts.json")
+    return render(request, repo.all("hospital_contacts"))
 
 @app.get("/hospital_certifications", tags=["Certifications"])
-def get_hospital_certifications():
+def get_hospital_certifications(request: Request):
     """Get all hospital certifications"""
-    file_path = os.path.join("data", "hospital_certifications.json")
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            
-            # Normalize the data structure to ensure it's always an array
-            if isinstance(data, dict) and "certifications" in data:
-                # Extract from the certifications key if it exists
-                return data["certifications"]
-            elif isinstance(data, list):
-                # Already in the right format
-                return data
-            else:
-                # Return empty array for any other case
-                print("⚠️ Unexpected data format in hospital_certifications.json, returning empty array")
-                return []
-    except FileNotFoundError:
-        print("❌ File not found: hospital_certifications.json")
-        # Return empty array instead of error
-        return []
-    except json.JSONDecodeError as e:
-        print(f"❌ JSON decode error in hospital_certifications.json: {e}")
+        certifications = repo.all("hospital_certifications")
+    except HTTPException:
         # Return empty array instead of error
-        return []
-    except Exception as e:
-        print(f"❌ Unexpected error loading hospital_certifications.json: {e}")
-        # Return empty array instead of error
-        return []
+        certifications = []
+    return render(request, certifications)
 
 @app.get("/hospital_equipment", tags=["Equipment"])
-def get_hospital_equipment():
+def get_hospital_equipment(request: Request):
     """Get all hospital equipment"""
-    return load_json_data("hospital_equipment.json")
+    return render(request, repo.all("hospital_equipment"))
 
 @app.get("/hospital_infrastructure", tags=["Infrastructure"])
-def get_hospital_infrastructure_all():
+def get_hospital_infrastructure_all(request: Request):
     """Get all hospital infrastructure data"""
-    return load_json_data("hospital_infrastructure.json")
+    return render(request, repo.all("hospital_infrastructure"))
 
 @app.get("/hospital_metrics", tags=["Metrics"])
-def get_hospital_metrics_all():
+def get_hospital_metrics_all(request: Request):
     """Get all hospital metrics"""
-    file_path = os.path.join("data", "hospital_metrics.json")
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data
-    except FileNotFoundError:
-        raise HTTPException(status_code=404, detail="Data file not found")
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=500, detail="Invalid JSON")
+    return render(request, repo.all("hospital_metrics"))
 
 @app.get("/wards_rooms", tags=["Wards"])
-def get_wards_rooms():
+def get_wards_rooms(request: Request):
     """Get all wards and rooms data"""
-    return load_json_data("wards_rooms.json")
+    return render(request, repo.all("wards_rooms"))
 
 @app.get("/medical_specialties", tags=["Medical"])
-def get_medical_specialties():
+def get_medical_specialties(request: Request):
     """Get all medical specialties"""
-    return load_json_data("medical_specialties.json")
+    return render(request, repo.all("medical_specialties"))
 
 @app.get("/doctors", tags=["Medical"])  
-def get_doctors():
+def get_doctors(request: Request):
     """Get all doctors"""
-    return load_json_data("doctors.json")
+    return render(request, repo.all("doctors"))
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,142 @@
+"""Resolve incoming provider references to hospital records.
+
+References carrying a ``provider_code`` or ``registration_number`` are looked
+up in exact indexes (case and punctuation insensitive). Otherwise, or when
+those miss, the free-text ``name`` is matched against hospital names with
+character trigrams. Candidates are blocked by ``pin_code``, falling back to
+``city`` and then to the whole network when a block has no confident match.
+Each block has its own trigram postings, so a lookup only touches hospitals
+in that block. The Dice coefficient of the trigram sets is the confidence;
+unblocked matches are discounted.
+"""
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Set
+
+from cache import cached_for
+from repository import Repository
+
+# Words too common in hospital names to tell them apart
+NAME_STOPWORDS = {"the", "and", "of", "hospital", "hospitals", "pvt", "private", "ltd", "limited"}
+UNBLOCKED_PENALTY = 0.9
+AMBIGUITY_MARGIN = 0.05
+
+
+def normalize_identifier(value: Any) -> str:
+    return re.sub(r"[^0-9A-Z]", "", str(value).upper()) if value is not None else ""
+
+
+def normalize_name(value: Any) -> str:
+    tokens = re.sub(r"[^0-9a-z]+", " ", str(value or "").lower()).split()
+    meaningful = [token for token in tokens if token not in NAME_STOPWORDS]
+    return " ".join(meaningful or tokens)
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProviderIndex:
+    """Exact identifier maps plus per-block trigram postings over hospitals"""
+
+    def __init__(self, hospitals: List[Dict], addresses: List[Dict]):
+        self.hospitals = [h for h in hospitals if h.get("name")]
+        self.by_code: Dict[str, int] = {}
+        self.by_registration: Dict[str, int] = {}
+        position = {}
+        for i, hospital in enumerate(self.hospitals):
+            position[str(hospital.get("id"))] = i
+            if hospital.get("provider_code"):
+                self.by_code.setdefault(normalize_identifier(hospital["provider_code"]), i)
+            if hospital.get("registration_number"):
+                self.by_registration.setdefault(normalize_identifier(hospital["registration_number"]), i)
+
+        blocks: Dict[str, Set[int]] = defaultdict(set)
+        for addr in addresses:
+            i = position.get(str(addr.get("hospital_id")))
+            if i is None:
+                continue
+            if addr.get("pin_code"):
+                blocks[f"pin:{normalize_identifier(addr['pin_code'])}"].add(i)
+            if addr.get("city_town"):
+                blocks[f"city:{normalize_name(addr['city_town'])}"].add(i)
+        blocks["*"] = set(range(len(self.hospitals)))
+
+        grams = [trigrams(normalize_name(hospital["name"])) for hospital in self.hospitals]
+        self.gram_counts = [len(g) for g in grams]
+        # Block key -> trigram -> hospital positions
+        self.postings: Dict[str, Dict[str, List[int]]] = {}
+        for key, members in blocks.items():
+            block_postings: Dict[str, List[int]] = defaultdict(list)
+            for i in sorted(members):
+                for gram in grams[i]:
+                    block_postings[gram].append(i)
+            self.postings[key] = dict(block_postings)
+
+    def _summary(self, i: int, confidence: float, method: str) -> Dict[str, Any]:
+        hospital = self.hospitals[i]
+        return {
+            "hospital_id": str(hospital.get("id")),
+            "name": hospital.get("name"),
+            "provider_code": hospital.get("provider_code"),
+            "confidence": round(confidence, 4),
+            "method": method,
+        }
+
+    def _blocks_for(self, reference: Dict) -> List[Optional[str]]:
+        """Blocks to try in order: pin code, city, then unblocked (None)"""
+        keys = []
+        if reference.get("pin_code"):
+            keys.append(f"pin:{normalize_identifier(reference['pin_code'])}")
+        if reference.get("city"):
+            keys.append(f"city:{normalize_name(reference['city'])}")
+        return [key for key in keys if key in self.postings] + [None]
+
+    def _fuzzy(self, name: str, block: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        query = trigrams(normalize_name(name))
+        postings = self.postings[block or "*"]
+        shared: Counter = Counter()
+        for gram in query:
+            shared.update(postings.get(gram, ()))
+        scale = 1.0 if block else UNBLOCKED_PENALTY
+        method = f"name+{block.split(':', 1)[0]}" if block else "name"
+        scored = sorted(
+            ((scale * 2 * count / (len(query) + self.gram_counts[i]), i) for i, count in shared.items()),
+            key=lambda item: (-item[0], item[1]),
+        )
+        return [self._summary(i, score, method) for score, i in scored[:limit]]
+
+    def match(self, reference: Dict, min_confidence: float, limit: int) -> Dict[str, Any]:
+        """Best hospital for one reference with status matched, ambiguous, conflict or unmatched"""
+        result: Dict[str, Any] = {"reference_id": reference.get("reference_id")}
+
+        exact = []
+        for field, index in (("provider_code", self.by_code), ("registration_number", self.by_registration)):
+            i = index.get(normalize_identifier(reference.get(field))) if reference.get(field) else None
+            if i is not None:
+                exact.append((field, i))
+        if exact:
+            if len({i for _, i in exact}) > 1:
+                return dict(result, status="conflict", match=None,
+                            candidates=[self._summary(i, 0.5, field) for field, i in exact])
+            field, i = exact[0]
+            return dict(result, status="matched", match=self._summary(i, 1.0, field), candidates=[])
+
+        if not reference.get("name"):
+            return dict(result, status="unmatched", match=None, candidates=[])
+
+        for block in self._blocks_for(reference):
+            candidates = self._fuzzy(reference["name"], block, limit)
+            if candidates and candidates[0]["confidence"] >= min_confidence:
+                break
+        if not candidates or candidates[0]["confidence"] < min_confidence:
+            return dict(result, status="unmatched", match=None, candidates=candidates)
+        if len(candidates) > 1 and candidates[0]["confidence"] - candidates[1]["confidence"] < AMBIGUITY_MARGIN:
+            return dict(result, status="ambiguous", match=None, candidates=candidates)
+        return dict(result, status="matched", match=candidates[0], candidates=candidates[1:])
+
+
+def provider_index(repo: Repository) -> ProviderIndex:
+    """Provider matching index at the current dataset version"""
+    return cached_for(repo, "provider_index", lambda: ProviderIndex(repo.all("hospitals"), repo.all("hospital_addresses")))
@@ -0,0 +1,741 @@
+"""Storage engines for the hospital data.
+
+Two interchangeable engines sit behind the ``Repository`` interface:
+
+* ``JsonRepository`` reads the flat files in ``data/`` (the original behaviour).
+* ``SqliteRepository`` serves the same rows from an embedded SQLite database
+  with indexed lookup columns, pooled connections and parameterized statements.
+* ``SnapshotRepository`` (see ``snapshots.py``) keeps the tables in memory as
+  immutable snapshots and is the only engine that accepts writes.
+
+The engine is picked with the ``DATA_ENGINE`` environment variable
+(``json`` by default, ``sqlite`` to use ``SQLITE_PATH``, ``memory`` for
+snapshots). Populate the database with::
+
+    python repository.py import
+"""
+import argparse
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DATA_DIR = os.environ.get("DATA_DIR", os.path.join(BASE_DIR, "data"))
+SQLITE_PATH = os.environ.get("SQLITE_PATH", os.path.join(BASE_DIR, "hospital_data.sqlite3"))
+
+# Common top-level keys that hold a list of items
+LIST_KEYS = ["hospitals", "documents", "certifications", "users", "contacts", "equipment", "specialties", "wards", "rooms", "metrics"]
+
+# Table name -> extra columns pulled out of each row and indexed in SQLite.
+# Every table also gets indexed ``id`` and ``hospital_id`` columns.
+TABLES: Dict[str, List[str]] = {
+    "hospitals": ["name", "hospital_type", "provider_code", "registration_number"],
+    "hospital_addresses": ["address_type", "city_town", "state", "pin_code"],
+    "hospital_contacts": ["contact_type"],
+    "hospital_summary": ["city_town", "state"],
+    "medical_specialties": ["specialty_name"],
+    "doctors": ["specialty_id"],
+    "hospital_equipment": ["category", "equipment_name"],
+    "hospital_infrastructure": ["category"],
+    "hospital_it_systems": ["system_type"],
+    "hospital_metrics": [],
+    "operation_theaters": ["ot_type"],
+    "icu_facilities": ["icu_type"],
+    "wards_rooms": ["ward_type", "room_category"],
+    "diagnostic_services": ["service_category"],
+    "support_services": ["service_name"],
+    "hospital_certifications": ["certification_type", "expiry_date"],
+    "compliance_licenses": ["license_type", "valid_upto"],
+    "document_uploads": ["entity_type", "document_type"],
+    "users": ["role"],
+}
+
+# Tables clients can write, stream and sync; ``users`` holds credentials and never leaves the server
+PUBLIC_TABLES = [table for table in TABLES if table != "users"]
+
+
+def load_json_data(filename: str) -> Any:
+    """Load JSON data from file without caching and with structure normalization"""
+    file_path = os.path.join(DATA_DIR, filename)
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+            # Normalize data structure by extracting the list from the top-level key
+            if isinstance(data, dict):
+                for key in LIST_KEYS:
+                    if key in data and isinstance(data[key], list):
+                        print(f"✅ Loaded {filename} and extracted list from '{key}' key")
+                        return data[key]
+
+                # If no common list key is found, return the dictionary as is
+                print(f"✅ Loaded {filename} with custom dictionary structure")
+                return data
+
+            elif isinstance(data, list):
+                print(f"✅ Loaded {filename} with list structure: {len(data)} items")
+                return data
+            else:
+                print(f"⚠️ Unexpected data type in {filename}: {type(data)}")
+                return data
+
+    except FileNotFoundError:
+        print(f"❌ File not found: {filename}")
+        raise HTTPException(status_code=404, detail=f"Data file {filename} not found")
+    except json.JSONDecodeError as e:
+        print(f"❌ JSON decode error in {filename}: {e}")
+        raise HTTPException(status_code=500, detail=f"Invalid JSON in {filename}")
+    except Exception as e:
+        print(f"❌ Unexpected error loading {filename}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error loading {filename}")
+
+
+def get_list_from_data(data: Any) -> List[Dict]:
+    """Helper to ensure we get a list from loaded JSON data"""
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        for key in LIST_KEYS:
+            if key in data and isinstance(data[key], list):
+                return data[key]
+    return []  # Return empty list if no list is found
+
+
+def _check_table(table: str) -> None:
+    if table not in TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table {table}")
+
+
+def _row_hospital_id(table: str, row: Dict) -> Optional[str]:
+    """Hospital a row belongs to (hospitals are keyed by their own id)"""
+    value = row.get("id") if table == "hospitals" else row.get("hospital_id")
+    return str(value) if value is not None else None
+
+
+class Repository:
+    """Read interface shared by the storage engines"""
+
+    name = "base"
+
+    def version(self) -> str:
+        """Opaque token that changes whenever the underlying data changes"""
+        raise NotImplementedError
+
+    def all(self, table: str) -> List[Dict]:
+        """All rows of a table"""
+        raise NotImplementedError
+
+    def by_hospital(self, table: str, hospital_id: str) -> List[Dict]:
+        """Rows of a table belonging to one hospital"""
+        raise NotImplementedError
+
+    def get_hospital(self, hospital_id: str) -> Optional[Dict]:
+        """Full hospital record or None"""
+        raise NotImplementedError
+
+    def primary_addresses(self) -> Dict[str, Dict]:
+        """Hospital id -> primary address (first address if none is marked Primary)"""
+        raise NotImplementedError
+
+    def search_hospitals(self, query: str) -> List[Tuple[Dict, Optional[str], str]]:
+        """Hospitals whose name or city contains ``query`` as (hospital, city, match_type)"""
+        raise NotImplementedError
+
+    def filter_hospitals(self, city: Optional[str] = None, hospital_type: Optional[str] = None,
+                         min_beds: Optional[int] = None) -> List[Dict]:
+        """Hospitals in ``city`` (primary address), of ``hospital_type`` and with at least ``min_beds`` registered beds"""
+        raise NotImplementedError
+
+    def group_count(self, table: str, column: str) -> Dict[Any, int]:
+        """Row counts grouped by a column value"""
+        raise NotImplementedError
+
+    def hospital_overview(self) -> Dict[str, Any]:
+        """Hospital count, distinct types and the bed total over the hospitals that report beds"""
+        raise NotImplementedError
+
+    def state_distribution(self) -> List[Dict]:
+        """Hospitals grouped by the state of their primary address, in order of first appearance.
+
+        Each group is ``{"state", "hospital_count", "total_beds", "operational_beds",
+        "hospitals": [(hospital, city, beds)]}``.
+        """
+        raise NotImplementedError
+
+    def equipment_by_hospital(self, equipment_type: Optional[str] = None) -> Tuple[List[Dict], int, Dict[Any, int]]:
+        """Equipment whose name contains ``equipment_type``, grouped per hospital and category.
+
+        Returns every hospital as ``{"hospital", "city", "state", "categories":
+        {category: [equipment]}, "total", "available"}``, the number of distinct
+        equipment names and the equipment count per category.
+        """
+        raise NotImplementedError
+
+    def specialty_coverage(self, specialty_name: Optional[str] = None) -> Tuple[List[Dict], List[Dict]]:
+        """Specialties whose name contains ``specialty_name``, for hospitals with a primary address.
+
+        Returns the hospitals grouped by city as ``{"city", "hospitals":
+        [(hospital, specialty_count)], "specialties": [...]}`` and grouped by
+        specialty as ``{"specialty_name", "cities": [...], "hospitals":
+        [(hospital_id, hospital_name, city)]}``, both in order of first appearance.
+        """
+        raise NotImplementedError
+
+
+def _beds(hospital: Dict) -> int:
+    return int(hospital.get("beds", hospital.get("beds_registered", 0)))
+
+
+class JsonRepository(Repository):
+    """Reads the flat JSON files on every call"""
+
+    name = "json"
+
+    def __init__(self, data_dir: str = DATA_DIR):
+        self.data_dir = data_dir
+
+    def version(self) -> str:
+        digest = hashlib.sha1()
+        for table in sorted(TABLES):
+            try:
+                stat = os.stat(os.path.join(self.data_dir, f"{table}.json"))
+            except FileNotFoundError:
+                continue
+            digest.update(f"{table}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+        return f"json-{digest.hexdigest()[:16]}"
+
+    def all(self, table: str) -> List[Dict]:
+        _check_table(table)
+        return get_list_from_data(load_json_data(f"{table}.json"))
+
+    def by_hospital(self, table: str, hospital_id: str) -> List[Dict]:
+        return [row for row in self.all(table) if _row_hospital_id(table, row) == str(hospital_id)]
+
+    def get_hospital(self, hospital_id: str) -> Optional[Dict]:
+        return next((h for h in self.all("hospitals") if str(h.get("hospital_id")) == hospital_id or str(h.get("id")) == hospital_id), None)
+
+    def primary_addresses(self) -> Dict[str, Dict]:
+        result: Dict[str, Dict] = {}
+        for addr in self.all("hospital_addresses"):
+            hospital_id = str(addr.get("hospital_id"))
+            if hospital_id not in result or (addr.get("address_type") == "Primary" and result[hospital_id].get("address_type") != "Primary"):
+                result[hospital_id] = addr
+        return result
+
+    def search_hospitals(self, query: str) -> List[Tuple[Dict, Optional[str], str]]:
+        query_lower = query.lower()
+        addresses = self.all("hospital_addresses")
+        primary = self.primary_addresses()
+        results = []
+        for hospital in self.all("hospitals"):
+            hospital_id = str(hospital.get("hospital_id", hospital.get("id")))
+            if query_lower in (hospital.get("name") or "").lower():
+                results.append((hospital, primary.get(hospital_id, {}).get("city_town"), "name"))
+                continue
+            city = next((addr["city_town"] for addr in addresses
+                         if str(addr.get("hospital_id")) == hospital_id and addr.get("city_town") and query_lower in addr["city_town"].lower()), None)
+            if city:
+                results.append((hospital, city, "city"))
+        return results
+
+    def filter_hospitals(self, city: Optional[str] = None, hospital_type: Optional[str] = None,
+                         min_beds: Optional[int] = None) -> List[Dict]:
+        primary = self.primary_addresses()
+        results = []
+        for hospital in self.all("hospitals"):
+            if city:
+                address = primary.get(str(hospital.get("id")))
+                if not address or address.get("address_type") != "Primary" or (address.get("city_town") or "").lower() != city.lower():
+                    continue
+            if hospital_type and (hospital.get("hospital_type") or "").lower() != hospital_type.lower():
+                continue
+            if min_beds and (hospital.get("beds_registered") or 0) < min_beds:
+                continue
+            results.append(hospital)
+        return results
+
+    def group_count(self, table: str, column: str) -> Dict[Any, int]:
+        counts: Dict[Any, int] = {}
+        for row in self.all(table):
+            counts[row.get(column)] = counts.get(row.get(column), 0) + 1
+        return counts
+
+    def hospital_overview(self) -> Dict[str, Any]:
+        hospitals = self.all("hospitals")
+        types: Dict[Any, None] = {}
+        bed_total = bed_count = 0
+        for hospital in hospitals:
+            if "type" in hospital or "hospital_type" in hospital:
+                types[hospital["type"] if "type" in hospital else hospital["hospital_type"]] = None
+            if "beds" in hospital or "beds_registered" in hospital:
+                bed_total += int(hospital["beds"] if "beds" in hospital else hospital["beds_registered"])
+                bed_count += 1
+        return {"hospital_count": len(hospitals), "types": list(types), "bed_total": bed_total, "bed_count": bed_count}
+
+    def state_distribution(self) -> List[Dict]:
+        primary = self.primary_addresses()
+        groups: Dict[str, Dict] = {}
+        for hospital in self.all("hospitals"):
+            address = primary.get(str(hospital.get("hospital_id", hospital.get("id"))))
+            if not address or not address.get("state"):
+                continue
+            group = groups.setdefault(address["state"], {
+                "state": address["state"], "hospital_count": 0, "total_beds": 0, "operational_beds": 0, "hospitals": [],
+            })
+            beds = _beds(hospital)
+            group["hospital_count"] += 1
+            group["total_beds"] += beds
+            group["operational_beds"] += int(beds * 0.85)
+            group["hospitals"].append((hospital, address.get("city_town"), beds))
+        return list(groups.values())
+
+    def equipment_by_hospital(self, equipment_type: Optional[str] = None) -> Tuple[List[Dict], int, Dict[Any, int]]:
+        equipment = self.all("hospital_equipment")
+        if equipment_type:
+            equipment = [eq for eq in equipment if equipment_type.lower() in eq.get("equipment_name", "").lower()]
+        by_hospital: Dict[str, List[Dict]] = {}
+        categories: Dict[Any, int] = {}
+        for eq in equipment:
+            by_hospital.setdefault(str(eq.get("hospital_id")), []).append(eq)
+            categories[eq.get("category")] = categories.get(eq.get("category"), 0) + 1
+
+        primary = self.primary_addresses()
+        hospitals = []
+        for hospital in self.all("hospitals"):
+            hospital_id = str(hospital.get("hospital_id", hospital.get("id")))
+            address = primary.get(hospital_id) or {}
+            rows = by_hospital.get(hospital_id, [])
+            by_category: Dict[Any, List[Dict]] = {}
+            for eq in rows:
+                by_category.setdefault(eq.get("category", "Uncategorized"), []).append(eq)
+            hospitals.append({
+                "hospital": hospital, "city": address.get("city_town"), "state": address.get("state"),
+                "categories": by_category, "total": len(rows), "available": sum(1 for eq in rows if eq.get("is_available")),
+            })
+        return hospitals, len({eq.get("equipment_name") for eq in equipment}), categories
+
+    def specialty_coverage(self, specialty_name: Optional[str] = None) -> Tuple[List[Dict], List[Dict]]:
+        specialties = self.all("medical_specialties")
+        if specialty_name:
+            specialties = [spec for spec in specialties if specialty_name.lower() in spec.get("specialty_name", "").lower()]
+        by_hospital: Dict[str, List[Dict]] = {}
+        for spec in specialties:
+            by_hospital.setdefault(str(spec.get("hospital_id")), []).append(spec)
+
+        primary = self.primary_addresses()
+        cities: Dict[Any, Dict] = {}
+        offered: Dict[Any, Dict] = {}
+        for hospital in self.all("hospitals"):
+            hospital_id = str(hospital.get("hospital_id", hospital.get("id")))
+            address = primary.get(hospital_id)
+            if not address:
+                continue
+            city = address.get("city_town", "Unknown")
+            rows = by_hospital.get(hospital_id, [])
+            group = cities.setdefault(city, {"city": city, "hospitals": [], "specialties": {}})
+            group["hospitals"].append((hospital, len(rows)))
+            for spec in rows:
+                name = spec.get("specialty_name")
+                group["specialties"][name] = None
+                coverage = offered.setdefault(name, {"specialty_name": name, "cities": {}, "hospitals": []})
+                coverage["cities"][city] = None
+                coverage["hospitals"].append((hospital["id"], hospital["name"], city))
+        for group in cities.values():
+            group["specialties"] = list(group["specialties"])
+        for coverage in offered.values():
+            coverage["cities"] = list(coverage["cities"])
+        return list(cities.values()), list(offered.values())
+
+
+# Each hospital's primary address: its first address marked Primary, else its first address
+_PRIMARY_ADDRESS_CTE = """
+    primary_address AS (
+        SELECT hospital_id, city_town, state FROM (
+            SELECT hospital_id, city_town, state,
+                   ROW_NUMBER() OVER (PARTITION BY hospital_id ORDER BY address_type = 'Primary' DESC, pk) AS position
+              FROM hospital_addresses)
+         WHERE position = 1)
+"""
+# Same precedence as the JSON engine: ``type`` over ``hospital_type``, ``beds`` over ``beds_registered``
+_TYPE_PATH = "CASE WHEN json_type(data, '$.type') IS NOT NULL THEN '$.type' ELSE '$.hospital_type' END"
+_BEDS_PATH = "CASE WHEN json_type(data, '$.beds') IS NOT NULL THEN '$.beds' ELSE '$.beds_registered' END"
+_BEDS = "CAST(COALESCE(json_extract(h.data, '$.beds'), json_extract(h.data, '$.beds_registered'), 0) AS INTEGER)"
+
+
+class SqliteRepository(Repository):
+    """Serves rows from an embedded SQLite database built by ``import_json``"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = SQLITE_PATH, pool_size: int = 8):
+        if not os.path.exists(path):
+            raise RuntimeError(f"SQLite database {path} not found, run `python repository.py import` first")
+        self.path = path
+        self.pool_size = pool_size
+        self._file_id = self._stat_file()
+        self._pool = self._open_pool()
+        self._version: Optional[str] = None
+        self._version_checked = 0.0
+        self._version_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Statements are always parameterized with fixed SQL text so the
+        # per-connection statement cache keeps them prepared.
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False, cached_statements=256)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def _stat_file(self) -> Tuple[int, int]:
+        stat = os.stat(self.path)
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _open_pool(self) -> "queue.Queue[sqlite3.Connection]":
+        pool: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=self.pool_size)
+        for _ in range(self.pool_size):
+            pool.put(self._connect())
+        return pool
+
+    def _reopen_if_replaced(self) -> None:
+        """Reconnect after ``import_json`` swapped in a new file; open connections keep reading the old one"""
+        try:
+            file_id = self._stat_file()
+        except FileNotFoundError:
+            return
+        if file_id == self._file_id:
+            return
+        stale, self._pool = self._pool, self._open_pool()
+        self._file_id = file_id
+        # Idle connections are closed now, checked-out ones go back to the stale pool and are dropped with it
+        while True:
+            try:
+                stale.get_nowait().close()
+            except queue.Empty:
+                break
+        print(f"✅ Reopened {self.path} after re-import")
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        pool = self._pool
+        conn = pool.get()
+        try:
+            yield conn
+        finally:
+            pool.put(conn)
+
+    def _rows(self, sql: str, params: Tuple = ()) -> List[Dict]:
+        with self._connection() as conn:
+            return [json.loads(data) for (data,) in conn.execute(sql, params)]
+
+    def version(self) -> str:
+        # The version only changes on re-import, so poll it at most once a second
+        with self._version_lock:
+            now = time.monotonic()
+            if self._version is None or now - self._version_checked > 1.0:
+                self._reopen_if_replaced()
+                with self._connection() as conn:
+                    row = conn.execute("SELECT value FROM dataset_meta WHERE key = 'version'").fetchone()
+                self._version = f"sqlite-{row[0] if row else 'unknown'}"
+                self._version_checked = now
+            return self._version
+
+    def all(self, table: str) -> List[Dict]:
+        _check_table(table)
+        return self._rows(f"SELECT data FROM {table} ORDER BY pk")
+
+    def by_hospital(self, table: str, hospital_id: str) -> List[Dict]:
+        _check_table(table)
+        return self._rows(f"SELECT data FROM {table} WHERE hospital_id = ? ORDER BY pk", (str(hospital_id),))
+
+    def get_hospital(self, hospital_id: str) -> Optional[Dict]:
+        rows = self._rows("SELECT data FROM hospitals WHERE hospital_id = ? ORDER BY pk LIMIT 1", (str(hospital_id),))
+        return rows[0] if rows else None
+
+    def primary_addresses(self) -> Dict[str, Dict]:
+        rows = self._rows(
+            "SELECT data FROM hospital_addresses ORDER BY hospital_id, address_type = 'Primary' DESC, pk"
+        )
+        result: Dict[str, Dict] = {}
+        for addr in rows:
+            result.setdefault(str(addr.get("hospital_id")), addr)
+        return result
+
+    def search_hospitals(self, query: str) -> List[Tuple[Dict, Optional[str], str]]:
+        pattern = f"%{query.lower()}%"
+        with self._connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT h.data,
+                       lower(h.name) LIKE ? AS name_match,
+                       (SELECT a.city_town FROM hospital_addresses a
+                         WHERE a.hospital_id = h.hospital_id
+                         ORDER BY a.address_type = 'Primary' DESC, a.pk LIMIT 1) AS primary_city,
+                       (SELECT a.city_town FROM hospital_addresses a
+                         WHERE a.hospital_id = h.hospital_id AND lower(a.city_town) LIKE ?
+                         ORDER BY a.pk LIMIT 1) AS matched_city
+                  FROM hospitals h
+                 WHERE lower(h.name) LIKE ?
+                    OR EXISTS (SELECT 1 FROM hospital_addresses a
+                                WHERE a.hospital_id = h.hospital_id AND lower(a.city_town) LIKE ?)
+                 ORDER BY h.pk
+                """,
+                (pattern, pattern, pattern, pattern),
+            ).fetchall()
+        return [
+            (json.loads(data), primary_city if name_match else matched_city, "name" if name_match else "city")
+            for data, name_match, primary_city, matched_city in rows
+        ]
+
+    def filter_hospitals(self, city: Optional[str] = None, hospital_type: Optional[str] = None,
+                         min_beds: Optional[int] = None) -> List[Dict]:
+        clauses, params = [], []
+        if city:
+            clauses.append(
+                "(SELECT lower(a.city_town) FROM hospital_addresses a"
+                " WHERE a.hospital_id = h.hospital_id AND a.address_type = 'Primary'"
+                " ORDER BY a.pk LIMIT 1) = lower(?)"
+            )
+            params.append(city)
+        if hospital_type:
+            clauses.append("lower(h.hospital_type) = lower(?)")
+            params.append(hospital_type)
+        if min_beds:
+            clauses.append("COALESCE(json_extract(h.data, '$.beds_registered'), 0) >= ?")
+            params.append(min_beds)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._rows(f"SELECT h.data FROM hospitals h{where} ORDER BY h.pk", tuple(params))
+
+    def group_count(self, table: str, column: str) -> Dict[Any, int]:
+        _check_table(table)
+        if column in TABLES[table]:
+            sql = f"SELECT {column}, COUNT(*) FROM {table} GROUP BY {column}"
+            params: Tuple = ()
+        else:
+            sql = f"SELECT json_extract(data, ?), COUNT(*) FROM {table} GROUP BY 1"
+            params = (f"$.{column}",)
+        with self._connection() as conn:
+            return {value: count for value, count in conn.execute(sql, params)}
+
+    def hospital_overview(self) -> Dict[str, Any]:
+        with self._connection() as conn:
+            count, types, bed_total, bed_count = conn.execute(
+                f"""
+                SELECT COUNT(*),
+                       json_group_array(DISTINCT json_extract(data, {_TYPE_PATH}))
+                           FILTER (WHERE json_type(data, '$.type') IS NOT NULL OR json_type(data, '$.hospital_type') IS NOT NULL),
+                       SUM(CAST(json_extract(data, {_BEDS_PATH}) AS INTEGER))
+                           FILTER (WHERE json_type(data, '$.beds') IS NOT NULL OR json_type(data, '$.beds_registered') IS NOT NULL),
+                       COUNT(*) FILTER (WHERE json_type(data, '$.beds') IS NOT NULL OR json_type(data, '$.beds_registered') IS NOT NULL)
+                  FROM hospitals
+                """
+            ).fetchone()
+        return {"hospital_count": count, "types": json.loads(types), "bed_total": bed_total or 0, "bed_count": bed_count}
+
+    def state_distribution(self) -> List[Dict]:
+        with self._connection() as conn:
+            rows = conn.execute(
+                f"""
+                WITH {_PRIMARY_ADDRESS_CTE}
+                SELECT state, COUNT(*), SUM(beds), SUM(CAST(beds * 0.85 AS INTEGER)),
+                       json_group_array(json_array(json(data), city_town, beds))
+                  FROM (SELECT h.pk, h.data, p.state, p.city_town, {_BEDS} AS beds
+                          FROM hospitals h JOIN primary_address p ON p.hospital_id = h.hospital_id
+                         WHERE p.state IS NOT NULL AND p.state != ''
+                         ORDER BY p.state, h.pk)
+                 GROUP BY state
+                 ORDER BY MIN(pk)
+                """
+            ).fetchall()
+        return [
+            {"state": state, "hospital_count": count, "total_beds": total, "operational_beds": operational,
+             "hospitals": [tuple(entry) for entry in json.loads(hospitals)]}
+            for state, count, total, operational, hospitals in rows
+        ]
+
+    def equipment_by_hospital(self, equipment_type: Optional[str] = None) -> Tuple[List[Dict], int, Dict[Any, int]]:
+        equipment = f"""
+            equipment AS (
+                SELECT pk, hospital_id, category, equipment_name, data,
+                       CASE WHEN json_type(data, '$.category') IS NULL THEN 'Uncategorized' ELSE category END AS grouping
+                  FROM hospital_equipment
+                 WHERE ? IS NULL OR instr(lower(equipment_name), lower(?)) > 0)
+        """
+        params = (equipment_type or None,) * 2
+        with self._connection() as conn:
+            hospitals = conn.execute(
+                f"""
+                WITH {_PRIMARY_ADDRESS_CTE}
+                SELECT h.hospital_id, h.data, p.city_town, p.state
+                  FROM hospitals h LEFT JOIN primary_address p ON p.hospital_id = h.hospital_id
+                 ORDER BY h.pk
+                """
+            ).fetchall()
+            groups = conn.execute(
+                f"""
+                WITH {equipment}
+                SELECT hospital_id, grouping, json_group_array(json(data)), COUNT(*),
+                       SUM(CASE WHEN json_extract(data, '$.is_available') THEN 1 ELSE 0 END)
+                  FROM (SELECT * FROM equipment ORDER BY hospital_id, grouping, pk)
+                 GROUP BY hospital_id, grouping
+                 ORDER BY MIN(pk)
+                """,
+                params,
+            ).fetchall()
+            (names,) = conn.execute(
+                f"WITH {equipment} SELECT COUNT(DISTINCT equipment_name) + COALESCE(MAX(equipment_name IS NULL), 0) FROM equipment",
+                params,
+            ).fetchone()
+            categories = conn.execute(f"WITH {equipment} SELECT category, COUNT(*) FROM equipment GROUP BY category", params).fetchall()
+
+        by_hospital: Dict[str, Dict] = {}
+        for hospital_id, category, rows, total, available in groups:
+            entry = by_hospital.setdefault(hospital_id, {"categories": {}, "total": 0, "available": 0})
+            entry["categories"][category] = json.loads(rows)
+            entry["total"] += total
+            entry["available"] += available
+        result = []
+        for hospital_id, data, city, state in hospitals:
+            entry = by_hospital.get(hospital_id, {"categories": {}, "total": 0, "available": 0})
+            result.append({"hospital": json.loads(data), "city": city, "state": state, **entry})
+        return result, names, dict(categories)
+
+    def specialty_coverage(self, specialty_name: Optional[str] = None) -> Tuple[List[Dict], List[Dict]]:
+        offered = f"""
+            {_PRIMARY_ADDRESS_CTE},
+            specialty AS (
+                SELECT pk, hospital_id, specialty_name FROM medical_specialties
+                 WHERE ? IS NULL OR instr(lower(specialty_name), lower(?)) > 0),
+            offered AS (
+                SELECT ROW_NUMBER() OVER (ORDER BY h.pk, s.pk) AS seq, h.id, h.name, p.city_town AS city, s.specialty_name
+                  FROM hospitals h
+                  JOIN primary_address p ON p.hospital_id = h.hospital_id
+                  JOIN specialty s ON s.hospital_id = h.hospital_id)
+        """
+        params = (specialty_name or None,) * 2
+        with self._connection() as conn:
+            cities = conn.execute(
+                f"""
+                WITH {offered},
+                city_specialties AS (
+                    SELECT city, json_group_array(DISTINCT specialty_name) AS names
+                      FROM (SELECT * FROM offered ORDER BY city, seq)
+                     GROUP BY city)
+                SELECT p.city_town,
+                       json_group_array(json_array(json(p.data), p.specialty_count)),
+                       COALESCE(c.names, '[]')
+                  FROM (SELECT h.pk, h.data, a.city_town,
+                               (SELECT COUNT(*) FROM specialty s WHERE s.hospital_id = h.hospital_id) AS specialty_count
+                          FROM hospitals h JOIN primary_address a ON a.hospital_id = h.hospital_id
+                         ORDER BY a.city_town, h.pk) p
+                  LEFT JOIN city_specialties c ON c.city IS p.city_town
+                 GROUP BY p.city_town
+                 ORDER BY MIN(p.pk)
+                """,
+                params,
+            ).fetchall()
+            specialties = conn.execute(
+                f"""
+                WITH {offered}
+                SELECT specialty_name, json_group_array(DISTINCT city), json_group_array(json_array(id, name, city))
+                  FROM (SELECT * FROM offered ORDER BY specialty_name, seq)
+                 GROUP BY specialty_name
+                 ORDER BY MIN(seq)
+                """,
+                params,
+            ).fetchall()
+        return (
+            [{"city": city, "hospitals": [tuple(entry) for entry in json.loads(hospitals)], "specialties": json.loads(names)}
+             for city, hospitals, names in cities],
+            [{"specialty_name": name, "cities": json.loads(cities_json), "hospitals": [tuple(entry) for entry in json.loads(hospitals)]}
+             for name, cities_json, hospitals in specialties],
+        )
+
+
+def import_json(db_path: str = SQLITE_PATH, data_dir: str = DATA_DIR) -> Dict[str, int]:
+    """Load every ``data/*.json`` table into a fresh SQLite database"""
+    tmp_path = f"{db_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    counts: Dict[str, int] = {}
+    digest = hashlib.sha1()
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("CREATE TABLE dataset_meta (key TEXT PRIMARY KEY, value TEXT)")
+        for table, columns in TABLES.items():
+            file_path = os.path.join(data_dir, f"{table}.json")
+            if not os.path.exists(file_path):
+                print(f"⚠️ Skipping {table}: {file_path} not found")
+                continue
+            with open(file_path, 'r', encoding='utf-8') as f:
+                raw = f.read()
+            digest.update(raw.encode())
+            rows = get_list_from_data(json.loads(raw))
+
+            extra = "".join(f", {col}" for col in columns)
+            conn.execute(f"CREATE TABLE {table} (pk INTEGER PRIMARY KEY, id INTEGER, hospital_id TEXT{extra}, data TEXT NOT NULL)")
+            placeholders = ", ".join("?" for _ in range(len(columns) + 3))
+            conn.executemany(
+                f"INSERT INTO {table} (id, hospital_id{extra}, data) VALUES ({placeholders})",
+                (
+                    (row.get("id"), _row_hospital_id(table, row), *(row.get(col) for col in columns), json.dumps(row))
+                    for row in rows
+                ),
+            )
+            for col in ["id", "hospital_id", *columns]:
+                conn.execute(f"CREATE INDEX idx_{table}_{col} ON {table} ({col})")
+            counts[table] = len(rows)
+            print(f"✅ Imported {len(rows)} rows into {table}")
+
+        conn.execute("INSERT INTO dataset_meta (key, value) VALUES ('version', ?)", (digest.hexdigest()[:16],))
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+    return counts
+
+
+_repository: Optional[Repository] = None
+_repository_lock = threading.Lock()
+
+
+def get_repository() -> Repository:
+    """Process-wide repository for the configured ``DATA_ENGINE``"""
+    global _repository
+    if _repository is None:
+        with _repository_lock:
+            if _repository is None:
+                engine = os.environ.get("DATA_ENGINE", "json").lower()
+                if engine == "sqlite":
+                    _repository = SqliteRepository()
+                elif engine == "json":
+                    _repository = JsonRepository()
+                elif engine == "memory":
+                    from snapshots import SnapshotRepository
+                    _repository = SnapshotRepository()
+                else:
+                    raise RuntimeError(f"Unknown DATA_ENGINE {engine!r}, expected 'json', 'sqlite' or 'memory'")
+                print(f"✅ Using {_repository.name} storage engine")
+    return _repository
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hospital data storage tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Load data/*.json into SQLite")
+    import_parser.add_argument("--db", default=SQLITE_PATH, help="SQLite database path")
+    import_parser.add_argument("--data-dir", default=DATA_DIR, help="Directory with the JSON files")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        totals = import_json(args.db, args.data_dir)
+        print(f"✅ Imported {sum(totals.values())} rows across {len(totals)} tables into {args.db}")
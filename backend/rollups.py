@@ -0,0 +1,87 @@
+"""Precomputed aggregates served by the analytics endpoints"""
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+from cache import cached_for
+from repository import Repository
+
+BED_CAPACITY_GROUPS = ["hospital", "ward_type", "room_category", "city", "state", "hospital_ward_type"]
+
+
+def _new_bed_bucket() -> Dict[str, Any]:
+    return {"ward_count": 0, "total_beds": 0, "available_beds": 0, "rate_sum": 0, "rate_count": 0,
+            "min_daily_rate": None, "max_daily_rate": None}
+
+
+def _add_ward(bucket: Dict[str, Any], ward: Dict) -> None:
+    bucket["ward_count"] += 1
+    bucket["total_beds"] += int(ward.get("total_beds") or 0)
+    bucket["available_beds"] += int(ward.get("available_beds") or 0)
+    rate = ward.get("daily_rate")
+    if rate is not None:
+        bucket["rate_sum"] += rate
+        bucket["rate_count"] += 1
+        bucket["min_daily_rate"] = rate if bucket["min_daily_rate"] is None else min(bucket["min_daily_rate"], rate)
+        bucket["max_daily_rate"] = rate if bucket["max_daily_rate"] is None else max(bucket["max_daily_rate"], rate)
+
+
+def _finish_bucket(bucket: Dict[str, Any]) -> Dict[str, Any]:
+    total, available = bucket["total_beds"], bucket["available_beds"]
+    occupied = total - available
+    return {
+        "ward_count": bucket["ward_count"],
+        "total_beds": total,
+        "available_beds": available,
+        "occupied_beds": occupied,
+        "occupancy_rate": round(occupied / total, 4) if total > 0 else 0,
+        "avg_daily_rate": round(bucket["rate_sum"] / bucket["rate_count"], 2) if bucket["rate_count"] else None,
+        "min_daily_rate": bucket["min_daily_rate"],
+        "max_daily_rate": bucket["max_daily_rate"],
+    }
+
+
+def _compute_bed_capacity(repo: Repository) -> Dict[str, Any]:
+    hospitals = {str(h.get("id")): h for h in repo.all("hospitals")}
+    primary_addresses = repo.primary_addresses()
+
+    totals = _new_bed_bucket()
+    buckets: Dict[str, Dict[Tuple, Dict[str, Any]]] = {group: defaultdict(_new_bed_bucket) for group in BED_CAPACITY_GROUPS}
+    for ward in repo.all("wards_rooms"):
+        hospital_id = str(ward.get("hospital_id"))
+        address = primary_addresses.get(hospital_id, {})
+        keys = {
+            "hospital": (hospital_id,),
+            "ward_type": (ward.get("ward_type"),),
+            "room_category": (ward.get("room_category"),),
+            "city": (address.get("city_town"),),
+            "state": (address.get("state"),),
+            "hospital_ward_type": (hospital_id, ward.get("ward_type")),
+        }
+        _add_ward(totals, ward)
+        for group, key in keys.items():
+            _add_ward(buckets[group][key], ward)
+
+    rollups: Dict[str, List[Dict[str, Any]]] = {}
+    for group, grouped in buckets.items():
+        rows = []
+        for key, bucket in grouped.items():
+            if group in ("hospital", "hospital_ward_type"):
+                hospital = hospitals.get(key[0], {})
+                address = primary_addresses.get(key[0], {})
+                row = {"hospital_id": key[0], "hospital_name": hospital.get("name"),
+                       "city": address.get("city_town"), "state": address.get("state")}
+                if group == "hospital_ward_type":
+                    row["ward_type"] = key[1]
+            else:
+                row = {group: key[0]}
+            row.update(_finish_bucket(bucket))
+            rows.append(row)
+        rows.sort(key=lambda r: r["total_beds"], reverse=True)
+        rollups[group] = rows
+
+    return {"totals": _finish_bucket(totals), "rollups": rollups}
+
+
+def bed_capacity_rollups(repo: Repository) -> Dict[str, Any]:
+    """Bed totals, availability and daily rates from wards_rooms, grouped several ways"""
+    return cached_for(repo, "bed_capacity", lambda: _compute_bed_capacity(repo))
@@ -0,0 +1,195 @@
+"""Composite hospital scores for the tier, infrastructure, risk and modernization views.
+
+Raw features are gathered into one column per feature across all hospitals,
+normalized column-wise to 0-100, averaged into components and combined with
+configurable component weights.
+"""
+import math
+from collections import defaultdict
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from cache import VersionedCache
+from repository import Repository
+
+# Same checklist and category weights as the frontend infrastructure score (Q05)
+INFRASTRUCTURE_CHECKLIST = {
+    "basic": ["Main Electrical Panel", "DG Set", "Water Treatment Plant", "CCTV System"],
+    "medical": ["Oxygen Pipeline", "Central Air Conditioning"],
+    "support": ["Fire Extinguisher System", "Network Infrastructure"],
+    "advanced": ["Main Building", "Emergency Block"],
+}
+INFRASTRUCTURE_WEIGHTS = {"basic": 0.35, "medical": 0.35, "support": 0.2, "advanced": 0.1}
+
+# Component -> [(feature, higher_is_better)]; features without a direction are already 0-100
+COMPONENT_FEATURES: Dict[str, List[Tuple[str, Optional[bool]]]] = {
+    "infrastructure": [("infrastructure_checklist", None)],
+    "critical_care": [("icu_bed_share", True), ("ventilators_per_icu_bed", True), ("ots_per_100_beds", True)],
+    "equipment": [("equipment_per_100_beds", True), ("equipment_available_share", True), ("avg_equipment_age", False)],
+    "staffing": [("doctor_bed_ratio", True), ("nurse_bed_ratio", True), ("icu_doctor_bed_ratio", True), ("icu_nurse_bed_ratio", True)],
+    "compliance": [("active_compliance_share", None)],
+}
+DEFAULT_WEIGHTS = {"infrastructure": 0.25, "critical_care": 0.2, "equipment": 0.15, "staffing": 0.25, "compliance": 0.15}
+
+# Same tier bands as the tier classification page (Q25)
+TIER_BANDS = [(80, 1), (65, 2), (50, 3), (0, 4)]
+
+# Keyed by client input (weight set, as-of date), so bounded unlike the per-version indexes
+MAX_CACHED_SCORES = 64
+_score_cache = VersionedCache(max_entries=MAX_CACHED_SCORES)
+
+def parse_weights(spec: Optional[str]) -> Dict[str, float]:
+    """``component:weight,...`` overrides on top of DEFAULT_WEIGHTS"""
+    weights = dict(DEFAULT_WEIGHTS)
+    if not spec:
+        return weights
+    for part in spec.split(","):
+        name, _, value = part.partition(":")
+        name = name.strip()
+        if name not in COMPONENT_FEATURES:
+            raise ValueError(f"unknown score component {name!r}, expected one of {', '.join(COMPONENT_FEATURES)}")
+        try:
+            weights[name] = float(value)
+        except ValueError:
+            raise ValueError(f"weight for {name} must be a number")
+        if not math.isfinite(weights[name]):
+            raise ValueError(f"weight for {name} must be a finite number")
+        if weights[name] < 0:
+            raise ValueError(f"weight for {name} must not be negative")
+    if sum(weights.values()) <= 0:
+        raise ValueError("at least one weight must be positive")
+    if not math.isfinite(sum(weights.values())):
+        raise ValueError("weights are too large")
+    return weights
+
+
+def _ratio(numerator: float, denominator: float) -> Optional[float]:
+    return numerator / denominator if denominator else None
+
+
+def _feature_columns(repo: Repository, as_of: str) -> Dict[str, Any]:
+    """Hospital ids plus one list per raw feature, aligned by position"""
+    hospitals = [h for h in repo.all("hospitals") if h.get("name")]
+    ids = [str(h.get("id")) for h in hospitals]
+
+    def group(table: str) -> Dict[str, List[Dict]]:
+        grouped: Dict[str, List[Dict]] = defaultdict(list)
+        for row in repo.all(table):
+            grouped[str(row.get("hospital_id"))].append(row)
+        return grouped
+
+    icus, ots, equipment = group("icu_facilities"), group("operation_theaters"), group("hospital_equipment")
+    infrastructure = group("hospital_infrastructure")
+    metrics = {hospital_id: rows[0] for hospital_id, rows in group("hospital_metrics").items()}
+    certifications, licenses = group("hospital_certifications"), group("compliance_licenses")
+    as_of_year = int(as_of[:4])
+
+    columns: Dict[str, List[Optional[float]]] = defaultdict(list)
+    for hospital, hospital_id in zip(hospitals, ids):
+        beds = hospital.get("beds_registered") or hospital.get("beds_operational") or 0
+        columns["beds"].append(beds)
+
+        icu_beds = sum(icu.get("total_beds") or 0 for icu in icus[hospital_id])
+        columns["icu_beds"].append(icu_beds)
+        columns["icu_bed_share"].append(_ratio(icu_beds, beds))
+        columns["ventilators_per_icu_bed"].append(_ratio(sum(icu.get("ventilators") or 0 for icu in icus[hospital_id]), icu_beds))
+        ot_count = sum((ot.get("major_ots") or 0) + (ot.get("minor_ots") or 0) or 1 for ot in ots[hospital_id])
+        columns["ots_per_100_beds"].append(_ratio(ot_count * 100, beds))
+
+        hospital_equipment = equipment[hospital_id]
+        quantity = sum(eq.get("quantity") or 1 for eq in hospital_equipment)
+        ages = [as_of_year - eq["installation_year"] for eq in hospital_equipment if eq.get("installation_year")]
+        columns["equipment_per_100_beds"].append(_ratio(quantity * 100, beds))
+        columns["equipment_available_share"].append(_ratio(sum(1 for eq in hospital_equipment if eq.get("is_available")), len(hospital_equipment)))
+        columns["avg_equipment_age"].append(sum(ages) / len(ages) if ages else None)
+
+        items = {item.get("item_name") for item in infrastructure[hospital_id]}
+        columns["infrastructure_checklist"].append(sum(
+            INFRASTRUCTURE_WEIGHTS[category] * 100 * sum(1 for name in names if name in items) / len(names)
+            for category, names in INFRASTRUCTURE_CHECKLIST.items()
+        ))
+
+        metric = metrics.get(hospital_id, {})
+        for ratio in ("doctor_bed_ratio", "nurse_bed_ratio", "icu_doctor_bed_ratio", "icu_nurse_bed_ratio"):
+            columns[ratio].append(metric.get(ratio))
+
+        expiries = [c.get("expiry_date") for c in certifications[hospital_id]] + [l.get("valid_upto") for l in licenses[hospital_id]]
+        expiries = [str(expiry)[:10] for expiry in expiries if expiry]
+        columns["active_compliance_share"].append(
+            100 * sum(1 for expiry in expiries if expiry >= as_of) / len(expiries) if expiries else None
+        )
+
+    return {"hospitals": hospitals, "ids": ids, "columns": dict(columns)}
+
+
+def _normalize(values: List[Optional[float]], higher_is_better: Optional[bool]) -> List[float]:
+    """Min-max scale a feature column to 0-100 (missing values score 0)"""
+    if higher_is_better is None:
+        return [min(100.0, max(0.0, v)) if v is not None else 0.0 for v in values]
+    present = [v for v in values if v is not None]
+    if not present:
+        return [0.0] * len(values)
+    low, high = min(present), max(present)
+    span = high - low
+    scaled = []
+    for v in values:
+        if v is None:
+            scaled.append(0.0)
+        elif span == 0:
+            scaled.append(100.0)
+        else:
+            fraction = (v - low) / span
+            scaled.append(100.0 * (fraction if higher_is_better else 1 - fraction))
+    return scaled
+
+
+def _tier(score: float) -> int:
+    return next(tier for threshold, tier in TIER_BANDS if score >= threshold)
+
+
+def _risk_level(components: Dict[str, float]) -> str:
+    exposure = min(components["staffing"], components["compliance"])
+    return "high" if exposure < 40 else "medium" if exposure < 60 else "low"
+
+
+def _compute_scores(repo: Repository, weights: Dict[str, float], as_of: str) -> List[Dict[str, Any]]:
+    features = _score_cache.get(("score_features", as_of), repo.version(), lambda: _feature_columns(repo, as_of))
+    columns = features["columns"]
+    count = len(features["ids"])
+
+    component_columns: Dict[str, List[float]] = {}
+    for component, feature_list in COMPONENT_FEATURES.items():
+        scaled = [_normalize(columns[feature], direction) for feature, direction in feature_list]
+        component_columns[component] = [sum(values) / len(values) for values in zip(*scaled)] if count else []
+
+    total_weight = sum(weights.values())
+    composite = [
+        sum(weights[component] * component_columns[component][i] for component in COMPONENT_FEATURES) / total_weight
+        for i in range(count)
+    ]
+
+    results = []
+    for i, hospital in enumerate(features["hospitals"]):
+        components = {component: round(values[i], 2) for component, values in component_columns.items()}
+        results.append({
+            "hospital_id": features["ids"][i],
+            "name": hospital.get("name"),
+            "hospital_type": hospital.get("hospital_type"),
+            "category": hospital.get("category"),
+            "composite_score": round(composite[i], 2),
+            "tier": _tier(composite[i]),
+            "risk_level": _risk_level(components),
+            "components": components,
+            "features": {name: (round(values[i], 4) if isinstance(values[i], float) else values[i]) for name, values in columns.items()},
+        })
+    results.sort(key=lambda row: row["composite_score"], reverse=True)
+    for rank, row in enumerate(results, start=1):
+        row["rank"] = rank
+    return results
+
+
+def hospital_scores(repo: Repository, weights: Dict[str, float], as_of: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Ranked composite scores, cached per dataset version, weight set and as-of date"""
+    as_of = as_of or date.today().isoformat()
+    key = ("hospital_scores", tuple(sorted(weights.items())), as_of)
+    return _score_cache.get(key, repo.version(), lambda: _compute_scores(repo, weights, as_of))
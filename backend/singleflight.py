@@ -0,0 +1,102 @@
+"""Single-flight coalescing for expensive, concurrently requested computations.
+
+Concurrent calls with the same key share one execution: the first caller
+(the leader) starts the computation, later callers await its result.
+Coalescing and admission happen on the event loop, so waiting requests hold
+no worker thread; only admitted computations are dispatched to the
+threadpool, through a bounded semaphore so a burst of different requests
+cannot take over the whole worker pool.
+"""
+import asyncio
+import functools
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+from repository import get_repository
+
+MAX_CONCURRENT_COMPUTATIONS = 4
+ADMISSION_TIMEOUT_SECONDS = 10.0
+
+
+class _Saturated(Exception):
+    """No computation slot freed up within the admission timeout"""
+
+
+class SingleFlight:
+    """Shares in-flight results between identical concurrent calls"""
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_COMPUTATIONS, admission_timeout: float = ADMISSION_TIMEOUT_SECONDS):
+        self.max_concurrent = max_concurrent
+        self.admission_timeout = admission_timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._calls: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self._stats = {"requests": 0, "executions": 0, "coalesced": 0, "rejected": 0, "errors": 0}
+
+    def _bind(self) -> None:
+        # Slots and in-flight calls belong to the event loop they were created on
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+            self._calls = {}
+
+    async def _execute(self, compute: Callable[[], Any]) -> Any:
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.admission_timeout)
+        except asyncio.TimeoutError:
+            raise _Saturated()
+        try:
+            self._stats["executions"] += 1
+            return await run_in_threadpool(compute)
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+        finally:
+            self._slots.release()
+
+    async def do(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Result of ``compute()`` run in the threadpool, shared with identical concurrent calls"""
+        self._bind()
+        self._stats["requests"] += 1
+        call = self._calls.get(key)
+        if call is not None:
+            self._stats["coalesced"] += 1
+        else:
+            # A task of its own, so the leader disconnecting does not cancel it for the others
+            call = self._calls[key] = asyncio.ensure_future(self._execute(compute))
+            call.add_done_callback(lambda done: self._calls.pop(key, None) if self._calls.get(key) is done else None)
+        try:
+            return await asyncio.shield(call)
+        except _Saturated:
+            self._stats["rejected"] += 1
+            raise HTTPException(status_code=503, detail="Server busy, retry shortly")
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats, in_flight=len(self._calls), max_concurrent=self.max_concurrent)
+
+
+analytics_flight = SingleFlight()
+
+
+def coalesced(route: str, flight: SingleFlight = analytics_flight):
+    """Turn a sync endpoint into one whose identical concurrent requests share one execution.
+
+    The key is the route name, the dataset version and the endpoint's keyword
+    arguments (the parsed query parameters) with surrounding whitespace
+    stripped from strings; ``Request`` arguments are left out of the key.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            params = tuple(sorted(
+                (name, value.strip() if isinstance(value, str) else value)
+                for name, value in kwargs.items() if not isinstance(value, Request)
+            ))
+            # A request that arrives after a write must not join a computation on the older data
+            version = await run_in_threadpool(get_repository().version)
+            return await flight.do((route, version, params), functools.partial(func, *args, **kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,401 @@
+"""In-memory storage engine with copy-on-write snapshots and a bulk write path.
+
+``SnapshotRepository`` (``DATA_ENGINE=memory``) loads every table from
+``data/`` into an immutable ``Snapshot``. Readers only ever dereference the
+current snapshot, so they never take a lock and never see a partial write.
+
+Writes are queued to a single writer thread. It folds every queued batch into
+a new snapshot that shares unchanged tables and their indexes with the
+previous one, rebuilds the derived indexes and rollups, persists the changed
+tables and only then swaps the snapshot in. A batch that fails validation is
+rejected on its own without affecting the other batches committed with it.
+
+Persistence is all-or-nothing across tables: the changed tables are written
+to ``.tmp`` files, then a commit manifest naming them is atomically put in
+place, and only then are the files moved over the live ones. The manifest is
+the commit point; a commit interrupted after it is rolled forward the next
+time the data directory is loaded.
+"""
+import contextvars
+import json
+import os
+import queue
+import threading
+from collections import defaultdict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from cache import VersionedCache
+from capabilities import capability_index
+from document_index import document_index
+from expiry_index import EXPIRY_SOURCES, expiry_index
+from provider_match import provider_index
+from repository import DATA_DIR, TABLES, JsonRepository, Repository, _check_table, _row_hospital_id, get_list_from_data
+from rollups import bed_capacity_rollups
+from sync_index import live_rows, sync_log, to_micros
+
+# Upper bound on batches folded into one snapshot by the writer
+MAX_GROUP_COMMIT = 64
+COMMIT_MANIFEST = "_commit_manifest.json"
+
+# Tables whose rows belong to a hospital through ``hospital_id``
+HOSPITAL_CHILD_TABLES = [table for table in TABLES if table not in ("hospitals", "hospital_summary", "document_uploads")]
+
+_pinned_snapshot: "contextvars.ContextVar[Optional[Snapshot]]" = contextvars.ContextVar("pinned_snapshot", default=None)
+
+
+class Snapshot(JsonRepository):
+    """Immutable copy of every table plus per-hospital lookup indexes.
+
+    Rows are shared between snapshots, so callers must not modify them.
+    """
+
+    name = "snapshot"
+
+    def __init__(self, tables: Dict[str, Tuple[Dict, ...]], version: str,
+                 base: Optional["Snapshot"] = None, changed: Iterable[str] = ()):
+        self.tables = tables
+        self._version = version
+        self.derived = VersionedCache()
+        changed = set(changed)
+
+        self._by_hospital: Dict[str, Dict[Optional[str], Tuple[Dict, ...]]] = {}
+        for table, rows in tables.items():
+            if base is not None and table not in changed:
+                self._by_hospital[table] = base._by_hospital[table]
+                continue
+            grouped: Dict[Optional[str], List[Dict]] = defaultdict(list)
+            for row in rows:
+                grouped[_row_hospital_id(table, row)].append(row)
+            self._by_hospital[table] = {hospital_id: tuple(group) for hospital_id, group in grouped.items()}
+
+        if base is not None and "hospital_addresses" not in changed:
+            self._primary = base._primary
+        else:
+            self._primary = super().primary_addresses()
+
+    @classmethod
+    def load(cls, data_dir: str = DATA_DIR) -> "Snapshot":
+        finished = _finish_commit(data_dir)
+        if finished:
+            print(f"✅ Finished interrupted commit of {', '.join(finished)}")
+        tables: Dict[str, Tuple[Dict, ...]] = {}
+        for table in TABLES:
+            file_path = os.path.join(data_dir, f"{table}.json")
+            if not os.path.exists(file_path):
+                print(f"⚠️ Skipping {table}: {file_path} not found")
+                tables[table] = ()
+                continue
+            with open(file_path, 'r', encoding='utf-8') as f:
+                tables[table] = tuple(get_list_from_data(json.load(f)))
+        print(f"✅ Loaded {sum(len(rows) for rows in tables.values())} rows across {len(tables)} tables into memory")
+        digest = JsonRepository(data_dir).version().split("-", 1)[1]
+        return cls(tables, f"memory-{digest}-0")
+
+    def version(self) -> str:
+        return self._version
+
+    def all(self, table: str) -> List[Dict]:
+        _check_table(table)
+        return list(self.tables[table])
+
+    def by_hospital(self, table: str, hospital_id: str) -> List[Dict]:
+        _check_table(table)
+        return list(self._by_hospital[table].get(str(hospital_id), ()))
+
+    def get_hospital(self, hospital_id: str) -> Optional[Dict]:
+        rows = self._by_hospital["hospitals"].get(str(hospital_id))
+        return rows[0] if rows else None
+
+    def primary_addresses(self) -> Dict[str, Dict]:
+        return dict(self._primary)
+
+    def warm(self) -> None:
+        """Build the derived indexes and rollups before the snapshot goes live"""
+        bed_capacity_rollups(self)
+        for source in EXPIRY_SOURCES:
+            expiry_index(self, source)
+        document_index(self)
+        capability_index(self)
+        provider_index(self)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _finish_commit(data_dir: str) -> List[str]:
+    """Move the files of a commit whose manifest is in place over the live tables, then drop the manifest"""
+    manifest_path = os.path.join(data_dir, COMMIT_MANIFEST)
+    if not os.path.exists(manifest_path):
+        return []
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        tables = json.load(f)["tables"]
+    for table in tables:
+        file_path = os.path.join(data_dir, f"{table}.json")
+        if os.path.exists(f"{file_path}.tmp"):
+            os.replace(f"{file_path}.tmp", file_path)
+    os.remove(manifest_path)
+    return tables
+
+
+def _check_id(table: str, row_id: Any) -> None:
+    # bool is an int subclass, but True would silently match the row with id 1
+    if isinstance(row_id, bool) or not isinstance(row_id, (int, str)):
+        raise ValueError(f"{table}: row ids must be integers or strings, got {json.dumps(row_id)}")
+
+
+def _apply(tables: Dict[str, Tuple[Dict, ...]], changes: Dict[str, Dict[str, List]], now: str) -> Tuple[Dict[str, Tuple[Dict, ...]], Dict[str, Dict[str, int]], Dict[str, List[Tuple[Any, Optional[str]]]]]:
+    """New row tuples for the tables a batch touches, per-table counts and deleted (id, hospital_id) pairs.
+
+    Upserts are matched on ``id`` and merged into the existing row; rows
+    without an id get the next free one. Deletes run after the upserts.
+    """
+    staged: Dict[str, Tuple[Dict, ...]] = {}
+    summary: Dict[str, Dict[str, int]] = {}
+    removed: Dict[str, List[Tuple[Any, Optional[str]]]] = {}
+    touched: Dict[str, List[Dict]] = {}
+
+    for table, ops in changes.items():
+        rows = list(tables[table])
+        positions = {str(row.get("id")): i for i, row in enumerate(rows)}
+        next_id = max((row["id"] for row in rows if isinstance(row.get("id"), int)), default=0) + 1
+        counts = {"inserted": 0, "updated": 0, "deleted": 0}
+        written = []
+
+        for row in ops.get("upsert", []):
+            if not isinstance(row, dict):
+                raise ValueError(f"{table}: rows must be JSON objects")
+            if row.get("id") is not None:
+                _check_id(table, row["id"])
+            key = str(row["id"]) if row.get("id") is not None else None
+            if key in positions:
+                merged = {**rows[positions[key]], **row, "updated_at": now}
+                rows[positions[key]] = merged
+                counts["updated"] += 1
+            else:
+                merged = dict(row)
+                if merged.get("id") is None:
+                    merged["id"] = next_id
+                if isinstance(merged["id"], int):
+                    next_id = max(next_id, merged["id"] + 1)
+                merged.setdefault("created_at", now)
+                merged.setdefault("is_active", True)
+                merged["updated_at"] = now
+                positions[str(merged["id"])] = len(rows)
+                rows.append(merged)
+                counts["inserted"] += 1
+            written.append(merged)
+
+        for row_id in ops.get("delete", []):
+            _check_id(table, row_id)
+        deleted = {str(row_id) for row_id in ops.get("delete", [])}
+        if deleted:
+            kept = [row for row in rows if str(row.get("id")) not in deleted]
+            removed[table] = [(row.get("id"), _row_hospital_id(table, row)) for row in rows if str(row.get("id")) in deleted]
+            counts["deleted"] = len(removed[table])
+            rows = kept
+
+        staged[table] = tuple(rows)
+        summary[table] = counts
+        touched[table] = written
+
+    hospital_ids = {str(h.get("id")) for h in staged.get("hospitals", tables["hospitals"])}
+    for table, written in touched.items():
+        if table == "hospitals":
+            continue
+        for row in written:
+            if row.get("hospital_id") is None:
+                if table in HOSPITAL_CHILD_TABLES:
+                    raise ValueError(f"{table} row {row.get('id')} needs a hospital_id")
+            elif str(row["hospital_id"]) not in hospital_ids:
+                raise ValueError(f"{table} row {row.get('id')} references unknown hospital {row['hospital_id']}")
+
+    deleted_hospitals = {hospital_id for _, hospital_id in removed.get("hospitals", ())}
+    if deleted_hospitals:
+        for table in HOSPITAL_CHILD_TABLES:
+            children = sum(1 for row in staged.get(table, tables[table]) if str(row.get("hospital_id")) in deleted_hospitals)
+            if children:
+                raise ValueError(f"cannot delete hospitals {', '.join(sorted(deleted_hospitals))}: "
+                                 f"{children} {table} rows still reference them, delete those in the same batch")
+    return staged, summary, removed
+
+
+class SnapshotRepository(Repository):
+    """Serves reads from the current snapshot and commits writes on a writer thread"""
+
+    name = "memory"
+
+    def __init__(self, data_dir: str = DATA_DIR):
+        self.data_dir = data_dir
+        self._snapshot = Snapshot.load(data_dir)
+        self._snapshot.warm()
+        self._generation = 0
+        self._queue: "queue.Queue[Tuple[Dict[str, Dict[str, List]], Future]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._listeners: List[Callable[[Snapshot, Snapshot, Set[str]], None]] = []
+
+    def add_listener(self, callback: Callable[["Snapshot", "Snapshot", Set[str]], None]) -> None:
+        """Call ``callback(previous, snapshot, changed_tables)`` on the writer thread after each commit"""
+        self._listeners.append(callback)
+
+    def current(self) -> Snapshot:
+        """Snapshot pinned for this request, else the latest one"""
+        pinned = _pinned_snapshot.get()
+        return pinned if pinned is not None else self._snapshot
+
+    @contextmanager
+    def pinned(self) -> Iterator[Snapshot]:
+        """Keep every read in this context on one snapshot"""
+        snapshot = self._snapshot
+        token = _pinned_snapshot.set(snapshot)
+        try:
+            yield snapshot
+        finally:
+            _pinned_snapshot.reset(token)
+
+    @property
+    def derived(self) -> VersionedCache:
+        return self.current().derived
+
+    def version(self) -> str:
+        return self.current().version()
+
+    def all(self, table: str) -> List[Dict]:
+        return self.current().all(table)
+
+    def by_hospital(self, table: str, hospital_id: str) -> List[Dict]:
+        return self.current().by_hospital(table, hospital_id)
+
+    def get_hospital(self, hospital_id: str) -> Optional[Dict]:
+        return self.current().get_hospital(hospital_id)
+
+    def primary_addresses(self) -> Dict[str, Dict]:
+        return self.current().primary_addresses()
+
+    def search_hospitals(self, query: str) -> List[Tuple[Dict, Optional[str], str]]:
+        return self.current().search_hospitals(query)
+
+    def filter_hospitals(self, city: Optional[str] = None, hospital_type: Optional[str] = None,
+                         min_beds: Optional[int] = None) -> List[Dict]:
+        return self.current().filter_hospitals(city, hospital_type, min_beds)
+
+    def group_count(self, table: str, column: str) -> Dict[Any, int]:
+        return self.current().group_count(table, column)
+
+    def hospital_overview(self) -> Dict[str, Any]:
+        return self.current().hospital_overview()
+
+    def state_distribution(self) -> List[Dict]:
+        return self.current().state_distribution()
+
+    def equipment_by_hospital(self, equipment_type: Optional[str] = None) -> Tuple[List[Dict], int, Dict[Any, int]]:
+        return self.current().equipment_by_hospital(equipment_type)
+
+    def specialty_coverage(self, specialty_name: Optional[str] = None) -> Tuple[List[Dict], List[Dict]]:
+        return self.current().specialty_coverage(specialty_name)
+
+    def submit(self, changes: Dict[str, Dict[str, List]]) -> Future:
+        """Queue a batch of ``{table: {"upsert": [...], "delete": [...]}}``.
+
+        The future resolves to the new dataset version and per-table counts
+        once the batch is live, or raises ``ValueError`` if it was rejected.
+        """
+        for table in changes:
+            _check_table(table)
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="snapshot-writer", daemon=True)
+                self._writer.start()
+        future: Future = Future()
+        self._queue.put((changes, future))
+        return future
+
+    def _write_loop(self) -> None:
+        while True:
+            batches = [self._queue.get()]
+            while len(batches) < MAX_GROUP_COMMIT:
+                try:
+                    batches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(batches)
+
+    def _commit(self, batches: List[Tuple[Dict[str, Dict[str, List]], Future]]) -> None:
+        base = self._snapshot
+        tables = dict(base.tables)
+        changed = set()
+        deletes: Dict[str, List[Tuple[Any, Optional[str]]]] = defaultdict(list)
+        applied = []
+        now = _now()
+        for changes, future in batches:
+            try:
+                staged, summary, removed = _apply(tables, changes, now)
+            except (ValueError, KeyError, TypeError) as e:
+                future.set_exception(ValueError(str(e)))
+                continue
+            tables.update(staged)
+            changed.update(staged)
+            for table, rows in removed.items():
+                deletes[table].extend(rows)
+            applied.append((future, summary))
+        if not applied:
+            return
+
+        try:
+            version = f"{base.version().rsplit('-', 1)[0]}-{self._generation + 1}"
+            snapshot = Snapshot(tables, version, base=base, changed=changed)
+            snapshot.warm()
+            self._persist(snapshot, changed)
+            # Tombstones carry the commit time, the same stamp as the rows written with them
+            sync_log().record(version, deletes, to_micros(now),
+                              live={table: live_rows(table, snapshot.tables[table]) for table in changed})
+        except Exception as e:
+            print(f"❌ Write batch failed: {e}")
+            for future, _ in applied:
+                future.set_exception(e)
+            return
+
+        self._generation += 1
+        self._snapshot = snapshot
+        print(f"✅ Committed {len(applied)} write batch(es) as {version}")
+        for future, summary in applied:
+            future.set_result({"version": version, "tables": summary})
+        for callback in list(self._listeners):
+            try:
+                callback(base, snapshot, changed)
+            except Exception as e:
+                print(f"⚠️ Snapshot listener failed: {e}")
+
+    def _persist(self, snapshot: Snapshot, changed: Iterable[str]) -> None:
+        """Write the changed tables as one commit; raises only if nothing was committed"""
+        tables = sorted(changed)
+        manifest_path = os.path.join(self.data_dir, COMMIT_MANIFEST)
+        # A commit whose renames failed earlier must land before its .tmp files are reused
+        _finish_commit(self.data_dir)
+        try:
+            for table in tables:
+                with open(os.path.join(self.data_dir, f"{table}.json.tmp"), 'w', encoding='utf-8') as f:
+                    json.dump(list(snapshot.tables[table]), f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+            with open(f"{manifest_path}.tmp", 'w', encoding='utf-8') as f:
+                json.dump({"version": snapshot.version(), "tables": tables}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(f"{manifest_path}.tmp", manifest_path)
+        except Exception:
+            for table in tables:
+                tmp_path = os.path.join(self.data_dir, f"{table}.json.tmp")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            raise
+
+        # Committed: from here on a failure is finished by the next commit or on the next load
+        try:
+            _finish_commit(self.data_dir)
+        except OSError as e:
+            print(f"⚠️ Commit {snapshot.version()} is durable but not yet moved into place: {e}")
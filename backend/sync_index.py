@@ -0,0 +1,249 @@
+"""Change tracking for incremental replication through ``/sync/{table}``.
+
+``SyncIndex`` orders a table's rows by change time (``updated_at``, else
+``created_at``) in integer microseconds, so the rows changed since a cursor
+are one bisect away. Deleted rows leave tombstones in the ``SyncLog``: the
+in-memory engine records them in its writer with the commit time, the other
+engines get them from the change hub when rows disappear between dataset
+versions. The log also keeps the ids of every live row, so rows removed while
+the server was down are found and tombstoned at startup. It remembers a
+change-time watermark per dataset version so a version works as a cursor too.
+
+Cursors are inclusive, so a change can be delivered twice but is never
+skipped. Consumers apply ``deleted`` before ``records``. Tombstones older than
+``TOMBSTONE_RETENTION_DAYS`` are pruned and cursors older than the log's
+horizon need a full resync.
+"""
+import json
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from cache import cached_for
+from repository import BASE_DIR, PUBLIC_TABLES, Repository, _row_hospital_id
+
+SYNC_LOG_PATH = os.environ.get("SYNC_LOG_PATH", os.path.join(BASE_DIR, "sync_log.json"))
+TOMBSTONE_RETENTION_DAYS = 90
+MAX_VERSION_MARKS = 1024
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def to_micros(value: Any) -> Optional[int]:
+    """ISO timestamp as integer microseconds since the epoch (naive means UTC)"""
+    if not value:
+        return None
+    try:
+        # A '+' in an unencoded query string arrives as a space
+        parsed = datetime.fromisoformat(str(value).strip().replace(" ", "+").replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return (parsed - _EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(micros: int) -> str:
+    return (_EPOCH + timedelta(microseconds=micros)).isoformat().replace("+00:00", "Z")
+
+
+def now_micros() -> int:
+    return (datetime.now(timezone.utc) - _EPOCH) // timedelta(microseconds=1)
+
+
+def live_rows(table: str, rows: Iterable[Dict]) -> List[Tuple[Any, Optional[str]]]:
+    """``(id, hospital_id)`` of each row, as tracked by the sync log"""
+    return [(row.get("id"), _row_hospital_id(table, row)) for row in rows]
+
+
+def change_stamp(row: Dict) -> int:
+    return to_micros(row.get("updated_at")) or to_micros(row.get("created_at")) or 0
+
+
+class SyncIndex:
+    """A table's rows sorted by change time"""
+
+    def __init__(self, rows: List[Dict]):
+        stamped = sorted(((change_stamp(row), position) for position, row in enumerate(rows)))
+        self.stamps = array("q", (stamp for stamp, _ in stamped))
+        self.rows = [rows[position] for _, position in stamped]
+
+    @property
+    def watermark(self) -> int:
+        return self.stamps[-1] if self.stamps else 0
+
+    def since(self, micros: int) -> List[Dict]:
+        return self.rows[bisect_left(self.stamps, micros):]
+
+
+def sync_index(repo: Repository, table: str) -> SyncIndex:
+    """Change-ordered index of a table at the current dataset version"""
+    return cached_for(repo, ("sync_index", table), lambda: SyncIndex(repo.all(table)))
+
+
+def global_watermark(repo: Repository) -> int:
+    """Latest change time across every replicated table at the current dataset version"""
+    return max(sync_index(repo, table).watermark for table in PUBLIC_TABLES)
+
+
+class SyncLog:
+    """Tombstones per table, live row ids and change-time watermarks per dataset version"""
+
+    def __init__(self, path: str = SYNC_LOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamps: Dict[str, array] = defaultdict(lambda: array("q"))
+        self._tombstones: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        # Table -> str(id) -> (id, hospital_id); None until the live rows have been recorded once
+        self._live: Optional[Dict[str, Dict[str, Tuple[Any, Optional[str]]]]] = None
+        self.horizon = now_micros()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            self.horizon = saved.get("horizon", self.horizon)
+            self._versions.update(saved.get("versions", {}))
+            for table, entries in saved.get("tombstones", {}).items():
+                for entry in entries:
+                    self._insert(table, entry)
+            if "live" in saved:
+                self._live = {table: self._live_map(rows) for table, rows in saved["live"].items()}
+
+    @staticmethod
+    def _live_map(rows: Iterable[Tuple[Any, Optional[str]]]) -> Dict[str, Tuple[Any, Optional[str]]]:
+        return {str(row_id): (row_id, hospital_id) for row_id, hospital_id in rows}
+
+    def _insert(self, table: str, entry: Dict[str, Any]) -> None:
+        stamp = to_micros(entry["deleted_at"])
+        stamps = self._stamps[table]
+        position = bisect_left(stamps, stamp + 1)
+        stamps.insert(position, stamp)
+        self._tombstones[table].insert(position, entry)
+
+    def _prune(self) -> None:
+        cutoff = now_micros() - TOMBSTONE_RETENTION_DAYS * 86400 * 1_000_000
+        if cutoff <= self.horizon:
+            return
+        for table, stamps in self._stamps.items():
+            keep = bisect_left(stamps, cutoff)
+            del stamps[:keep]
+            del self._tombstones[table][:keep]
+        self.horizon = cutoff
+
+    def _save(self) -> None:
+        payload = {"horizon": self.horizon, "versions": dict(self._versions),
+                   "tombstones": {table: entries for table, entries in self._tombstones.items() if entries}}
+        if self._live is not None:
+            payload["live"] = {table: list(rows.values()) for table, rows in self._live.items()}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, separators=(",", ":"), default=str)
+        os.replace(tmp_path, self.path)
+
+    def _mark(self, version: str, micros: int) -> None:
+        self._versions.setdefault(version, max(micros, self.horizon))
+        while len(self._versions) > MAX_VERSION_MARKS:
+            self._versions.popitem(last=False)
+
+    def record(self, version: Optional[str], deletes: Dict[str, Iterable[Tuple[Any, Optional[str]]]], micros: int,
+               live: Optional[Dict[str, Iterable[Tuple[Any, Optional[str]]]]] = None) -> None:
+        """Tombstone ``(id, hospital_id)`` pairs deleted at ``micros``, mark ``version`` and replace the live rows in ``live``"""
+        deleted_at = from_micros(micros)
+        with self._lock:
+            for table, rows in deletes.items():
+                for row_id, hospital_id in rows:
+                    self._insert(table, {"id": row_id, "hospital_id": hospital_id, "deleted_at": deleted_at})
+            if version is not None:
+                self._mark(version, micros)
+            if live and self._live is not None:
+                self._live.update({table: self._live_map(rows) for table, rows in live.items()})
+            self._prune()
+            self._save()
+
+    def reconcile(self, live: Dict[str, Iterable[Tuple[Any, Optional[str]]]], micros: int) -> int:
+        """Tombstone rows missing from ``live`` (every table's current rows) since they were last recorded.
+
+        Without recorded live rows to compare against, deletes before
+        ``micros`` are unknown, so the horizon moves up to it.
+        """
+        deleted_at = from_micros(micros)
+        current = {table: self._live_map(rows) for table, rows in live.items()}
+        missing = 0
+        with self._lock:
+            if self._live is None:
+                self.horizon = max(self.horizon, micros)
+            else:
+                for table, rows in current.items():
+                    for key, (row_id, hospital_id) in self._live.get(table, {}).items():
+                        if key not in rows:
+                            self._insert(table, {"id": row_id, "hospital_id": hospital_id, "deleted_at": deleted_at})
+                            missing += 1
+            self._live = current
+            self._prune()
+            self._save()
+        return missing
+
+    def mark_version(self, version: str, watermark: Callable[[], int]) -> None:
+        """Remember ``watermark()`` for ``version`` unless it is already known"""
+        if version in self._versions:
+            return
+        micros = watermark()
+        with self._lock:
+            if version not in self._versions:
+                self._mark(version, micros)
+                self._save()
+
+    def version_mark(self, version: str) -> Optional[int]:
+        return self._versions.get(version)
+
+    def deleted_since(self, table: str, micros: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Tombstones at or after ``micros`` and the latest tombstone time (0 if none)"""
+        with self._lock:
+            stamps = self._stamps.get(table)
+            if not stamps:
+                return [], 0
+            return self._tombstones[table][bisect_left(stamps, micros):], stamps[-1]
+
+
+_log: Optional[SyncLog] = None
+_log_lock = threading.Lock()
+
+
+def sync_log() -> SyncLog:
+    """Process-wide tombstone and version log"""
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = SyncLog()
+    return _log
+
+
+def reconcile_deletes(repo: Repository) -> None:
+    """Tombstone rows that were removed while the server was not running"""
+    pinned = getattr(repo, "pinned", None)
+    with pinned() if pinned else nullcontext():
+        live = {table: live_rows(table, repo.all(table)) for table in PUBLIC_TABLES}
+    missing = sync_log().reconcile(live, now_micros())
+    if missing:
+        print(f"✅ Recorded {missing} tombstones for rows deleted since the last run")
+
+
+def track_hub_deletes(repo: Repository, hub) -> None:
+    """Record tombstones from change hub deltas, for engines without an in-process writer"""
+    def record(version: str, deltas: Dict[str, List[Dict[str, Any]]]) -> None:
+        deletes = {
+            table: [(change["id"], change["hospital_id"]) for change in changes if change["op"] == "delete"]
+            for table, changes in deltas.items()
+        }
+        deletes = {table: rows for table, rows in deletes.items() if rows}
+        sync_log().record(None, deletes, now_micros(), live={table: hub.row_ids(table) for table in deltas})
+        if repo.version() == version:
+            sync_log().mark_version(version, lambda: global_watermark(repo))
+
+    hub.add_listener(record)
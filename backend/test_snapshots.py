@@ -0,0 +1,189 @@
+"""Tests for the in-memory engine's writer: pinning, validation, group commit, persistence and tombstones.
+
+Run from ``backend/`` with ``python -m pytest -q``.
+"""
+import glob
+import json
+import os
+import shutil
+from concurrent.futures import Future
+
+import pytest
+
+import snapshots
+import sync_index
+from snapshots import COMMIT_MANIFEST, SnapshotRepository
+from sync_index import SyncLog, reconcile_deletes
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    for path in glob.glob(os.path.join(DATA_DIR, "*.json")):
+        shutil.copy(path, data_dir)
+    monkeypatch.setattr(sync_index, "_log", SyncLog(str(tmp_path / "sync_log.json")))
+    return SnapshotRepository(str(data_dir))
+
+
+def _ward(repo):
+    return repo.by_hospital("wards_rooms", "121")[0]
+
+
+def _on_disk(repo, table):
+    with open(os.path.join(repo.data_dir, f"{table}.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _commit(repo, *batches):
+    """Commit batches as one group on the calling thread and return their futures"""
+    futures = [Future() for _ in batches]
+    repo._commit(list(zip(batches, futures)))
+    return futures
+
+
+def test_pinned_reads_stay_on_one_snapshot(repo):
+    ward = _ward(repo)
+    with repo.pinned():
+        version = repo.version()
+        repo.submit({"wards_rooms": {"upsert": [{"id": ward["id"], "available_beds": 0}]}}).result(timeout=10)
+        assert repo.version() == version
+        assert _ward(repo)["available_beds"] == ward["available_beds"]
+    assert repo.version() != version
+    assert _ward(repo)["available_beds"] == 0
+
+
+def test_rejected_batch_does_not_affect_its_group(repo):
+    ward = _ward(repo)
+    bad, good = _commit(
+        repo,
+        {"wards_rooms": {"upsert": [{"hospital_id": 999999, "total_beds": 1}]}},
+        {"wards_rooms": {"upsert": [{"id": ward["id"], "available_beds": 0}]}},
+    )
+    with pytest.raises(ValueError, match="unknown hospital"):
+        bad.result()
+    assert good.result()["tables"]["wards_rooms"]["updated"] == 1
+    assert len(repo.all("wards_rooms")) == 120
+    assert _ward(repo)["available_beds"] == 0
+
+
+def test_child_rows_need_a_hospital(repo):
+    (future,) = _commit(repo, {"hospital_metrics": {"upsert": [{"id": 999999, "doctor_bed_ratio": 9.9}]}})
+    with pytest.raises(ValueError, match="needs a hospital_id"):
+        future.result()
+    assert not any(row.get("hospital_id") is None for row in repo.all("hospital_metrics"))
+
+
+def test_hospital_delete_with_children_is_rejected(repo):
+    (future,) = _commit(repo, {"hospitals": {"delete": [121]}})
+    with pytest.raises(ValueError, match="still reference"):
+        future.result()
+    assert repo.get_hospital("121") is not None
+
+
+def test_hospital_delete_with_its_children(repo):
+    changes = {
+        table: {"delete": [row["id"] for row in repo.by_hospital(table, "121")]}
+        for table in snapshots.HOSPITAL_CHILD_TABLES if repo.by_hospital(table, "121")
+    }
+    changes["hospitals"] = {"delete": [121]}
+    (future,) = _commit(repo, changes)
+    future.result()
+    assert repo.get_hospital("121") is None
+    assert repo.by_hospital("wards_rooms", "121") == []
+
+
+def test_committed_batch_is_persisted_and_reloaded(repo):
+    ward = _ward(repo)
+    repo.submit({"wards_rooms": {"upsert": [{"id": ward["id"], "available_beds": 0}]}}).result(timeout=10)
+    reloaded = SnapshotRepository(repo.data_dir)
+    assert _ward(reloaded)["available_beds"] == 0
+    assert not os.path.exists(os.path.join(repo.data_dir, COMMIT_MANIFEST))
+
+
+def test_failure_before_the_manifest_leaves_disk_unchanged(repo, monkeypatch):
+    before = {table: _on_disk(repo, table) for table in ("hospitals", "wards_rooms")}
+    version = repo.version()
+    real_dump = json.dump
+
+    def failing_dump(obj, f, **kwargs):
+        if f.name.endswith("wards_rooms.json.tmp"):
+            raise OSError("disk full")
+        return real_dump(obj, f, **kwargs)
+
+    monkeypatch.setattr(snapshots.json, "dump", failing_dump)
+    (future,) = _commit(repo, {
+        "hospitals": {"upsert": [{"id": 121, "name": "Renamed"}]},
+        "wards_rooms": {"upsert": [{"id": _ward(repo)["id"], "available_beds": 0}]},
+    })
+    with pytest.raises(OSError):
+        future.result()
+    monkeypatch.undo()
+
+    assert repo.version() == version
+    assert {table: _on_disk(repo, table) for table in before} == before
+    assert not glob.glob(os.path.join(repo.data_dir, "*.tmp"))
+
+
+def test_interrupted_commit_is_rolled_forward_on_load(repo, monkeypatch):
+    ward = _ward(repo)
+    real_replace = os.replace
+
+    def failing_replace(src, dst):
+        if dst.endswith("wards_rooms.json"):
+            raise OSError("interrupted")
+        return real_replace(src, dst)
+
+    monkeypatch.setattr(snapshots.os, "replace", failing_replace)
+    (future,) = _commit(repo, {
+        "hospitals": {"upsert": [{"id": 121, "name": "Renamed"}]},
+        "wards_rooms": {"upsert": [{"id": ward["id"], "available_beds": 0}]},
+    })
+    # The manifest was in place, so the batch is committed even though a rename failed
+    future.result()
+    monkeypatch.undo()
+    assert os.path.exists(os.path.join(repo.data_dir, COMMIT_MANIFEST))
+
+    reloaded = SnapshotRepository(repo.data_dir)
+    assert reloaded.get_hospital("121")["name"] == "Renamed"
+    assert _ward(reloaded)["available_beds"] == 0
+    assert not os.path.exists(os.path.join(repo.data_dir, COMMIT_MANIFEST))
+
+
+def test_deletes_leave_tombstones(repo):
+    ward = _ward(repo)
+    result = repo.submit({"wards_rooms": {"delete": [ward["id"]]}}).result(timeout=10)
+    tombstones, latest = sync_index.sync_log().deleted_since("wards_rooms", 0)
+    assert [(entry["id"], entry["hospital_id"]) for entry in tombstones] == [(ward["id"], "121")]
+    assert sync_index.sync_log().version_mark(result["version"]) == latest
+
+
+def test_rows_removed_while_down_leave_tombstones(repo):
+    reconcile_deletes(repo)
+    (future,) = _commit(repo, {"wards_rooms": {"upsert": [{"hospital_id": 121, "total_beds": 4}]}})
+    future.result()
+    inserted = max(row["id"] for row in repo.all("wards_rooms"))
+
+    rows = _on_disk(repo, "wards_rooms")
+    removed = [row["id"] for row in rows[:2]] + [inserted]
+    with open(os.path.join(repo.data_dir, "wards_rooms.json"), "w", encoding="utf-8") as f:
+        json.dump([row for row in rows if row["id"] not in removed], f)
+
+    reconcile_deletes(SnapshotRepository(repo.data_dir))
+    tombstones, _ = sync_index.sync_log().deleted_since("wards_rooms", 0)
+    assert sorted(entry["id"] for entry in tombstones) == sorted(removed)
+
+
+@pytest.mark.parametrize("row_id", [{"a": 1}, [121], 1.5, True])
+def test_ids_must_be_integers_or_strings(repo, row_id):
+    upsert, delete = _commit(
+        repo,
+        {"wards_rooms": {"upsert": [{"id": row_id, "hospital_id": 121, "total_beds": 1}]}},
+        {"wards_rooms": {"delete": [row_id]}},
+    )
+    for future in (upsert, delete):
+        with pytest.raises(ValueError, match="integers or strings"):
+            future.result()
+    assert len(repo.all("wards_rooms")) == 120
@@ -0,0 +1,315 @@
+"""Per-hospital metric time series with daily and monthly rollups.
+
+Each (metric, hospital) series keeps its observations as two parallel
+``array`` columns (epoch seconds and values) sorted by time, plus one rollup
+per granularity holding count/sum/min/max per day or month bucket, so range
+queries and network-wide trends never rescan raw points.
+
+Observations come from the dataset itself: for every dataset version the
+current ``hospital_metrics`` rows (at ``last_calculated``) and per-hospital
+ward occupancy (at the latest ward ``updated_at``/``created_at``) are
+recorded; a new value at an already recorded time replaces the old one. With
+the in-memory engine this happens on every committed write, so updating those
+rows through the write API, including with past ``last_calculated`` values,
+builds up or backfills history; other engines are sampled when a request
+first sees a new version. The store is persisted to ``METRIC_SERIES_PATH``.
+"""
+import json
+import os
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from repository import BASE_DIR, Repository
+
+METRIC_SERIES_PATH = os.environ.get("METRIC_SERIES_PATH", os.path.join(BASE_DIR, "metric_series.json"))
+
+# Metric -> table it is observed from
+SERIES_METRICS = {
+    "doctor_bed_ratio": "hospital_metrics",
+    "nurse_bed_ratio": "hospital_metrics",
+    "icu_doctor_bed_ratio": "hospital_metrics",
+    "icu_nurse_bed_ratio": "hospital_metrics",
+    "total_doctors": "hospital_metrics",
+    "qualified_nurses": "hospital_metrics",
+    "bed_occupancy": "wards_rooms",
+    "available_beds": "wards_rooms",
+}
+GRANULARITIES = ["day", "month"]
+
+
+def _epoch(value: Any) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def _bucket(granularity: str, ts: int) -> int:
+    if granularity == "day":
+        return ts // 86400
+    moment = datetime.fromtimestamp(ts, tz=timezone.utc)
+    return moment.year * 12 + moment.month - 1
+
+
+def _bucket_label(granularity: str, bucket: int) -> str:
+    if granularity == "day":
+        return date.fromordinal(date(1970, 1, 1).toordinal() + bucket).isoformat()
+    return f"{bucket // 12:04d}-{bucket % 12 + 1:02d}"
+
+
+class Rollup:
+    """count/sum/min/max per time bucket, in parallel arrays sorted by bucket"""
+
+    __slots__ = ("buckets", "counts", "totals", "lows", "highs")
+
+    def __init__(self):
+        self.buckets = array("q")
+        self.counts = array("q")
+        self.totals = array("d")
+        self.lows = array("d")
+        self.highs = array("d")
+
+    def add(self, bucket: int, value: float) -> None:
+        i = bisect_left(self.buckets, bucket)
+        if i == len(self.buckets) or self.buckets[i] != bucket:
+            self.buckets.insert(i, bucket)
+            self.counts.insert(i, 0)
+            self.totals.insert(i, 0.0)
+            self.lows.insert(i, value)
+            self.highs.insert(i, value)
+        self.counts[i] += 1
+        self.totals[i] += value
+        self.lows[i] = min(self.lows[i], value)
+        self.highs[i] = max(self.highs[i], value)
+
+    def reset(self, bucket: int, values: List[float]) -> None:
+        """Recompute an existing bucket from all of its values"""
+        i = bisect_left(self.buckets, bucket)
+        self.counts[i] = len(values)
+        self.totals[i] = sum(values)
+        self.lows[i] = min(values)
+        self.highs[i] = max(values)
+
+    def span(self, first: Optional[int], last: Optional[int]) -> range:
+        """Positions of the buckets between ``first`` and ``last`` inclusive"""
+        lo = 0 if first is None else bisect_left(self.buckets, first)
+        hi = len(self.buckets) if last is None else bisect_right(self.buckets, last)
+        return range(lo, hi)
+
+
+class Series:
+    """Observations of one metric for one hospital"""
+
+    __slots__ = ("times", "values", "rollups")
+
+    def __init__(self):
+        self.times = array("q")
+        self.values = array("d")
+        self.rollups = {granularity: Rollup() for granularity in GRANULARITIES}
+
+    def add(self, ts: int, value: float) -> bool:
+        """Record a point, replacing the value of one already at ``ts``; False if nothing changed"""
+        i = bisect_left(self.times, ts)
+        if i < len(self.times) and self.times[i] == ts:
+            if self.values[i] == value:
+                return False
+            self.values[i] = value
+            for granularity, rollup in self.rollups.items():
+                bucket = _bucket(granularity, ts)
+                rollup.reset(bucket, [self.values[j] for j in self._bucket_positions(granularity, bucket, i)])
+            return True
+        self.times.insert(i, ts)
+        self.values.insert(i, value)
+        for granularity, rollup in self.rollups.items():
+            rollup.add(_bucket(granularity, ts), value)
+        return True
+
+    def _bucket_positions(self, granularity: str, bucket: int, i: int) -> range:
+        """Positions of the points around ``i`` that fall in ``bucket``"""
+        lo, hi = i, i + 1
+        while lo > 0 and _bucket(granularity, self.times[lo - 1]) == bucket:
+            lo -= 1
+        while hi < len(self.times) and _bucket(granularity, self.times[hi]) == bucket:
+            hi += 1
+        return range(lo, hi)
+
+    def span(self, start: Optional[int], end: Optional[int]) -> range:
+        lo = 0 if start is None else bisect_left(self.times, start)
+        hi = len(self.times) if end is None else bisect_right(self.times, end)
+        return range(lo, hi)
+
+
+def _observations(repo: Repository) -> Iterator[Tuple[str, str, int, float]]:
+    """(hospital_id, metric, epoch, value) for the current dataset"""
+    for row in repo.all("hospital_metrics"):
+        ts = _epoch(row.get("last_calculated")) or _epoch(row.get("updated_at")) or _epoch(row.get("created_at"))
+        if ts is None:
+            continue
+        for metric, table in SERIES_METRICS.items():
+            if table == "hospital_metrics" and row.get(metric) is not None:
+                yield str(row.get("hospital_id")), metric, ts, float(row[metric])
+
+    wards: Dict[str, List[Dict]] = defaultdict(list)
+    for ward in repo.all("wards_rooms"):
+        wards[str(ward.get("hospital_id"))].append(ward)
+    for hospital_id, rows in wards.items():
+        ts = max(filter(None, (_epoch(ward.get("updated_at")) or _epoch(ward.get("created_at")) for ward in rows)), default=None)
+        total = sum(int(ward.get("total_beds") or 0) for ward in rows)
+        if ts is None or total <= 0:
+            continue
+        available = sum(int(ward.get("available_beds") or 0) for ward in rows)
+        yield hospital_id, "bed_occupancy", ts, round((total - available) / total, 4)
+        yield hospital_id, "available_beds", ts, float(available)
+
+
+def _check_metric(metric: str) -> None:
+    if metric not in SERIES_METRICS:
+        raise ValueError(f"metric must be one of {', '.join(SERIES_METRICS)}")
+
+
+def _check_granularity(granularity: str, allow_raw: bool = False) -> None:
+    allowed = (["raw"] if allow_raw else []) + GRANULARITIES
+    if granularity not in allowed:
+        raise ValueError(f"granularity must be one of {', '.join(allowed)}")
+
+
+def _day_range(start: Optional[str], end: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """Epoch bounds covering the whole of the ``start`` and ``end`` dates"""
+    first = _epoch(f"{start}T00:00:00+00:00") if start else None
+    last = _epoch(f"{end}T23:59:59+00:00") if end else None
+    return first, last
+
+
+class TimeSeriesStore:
+    """All metric series, fed from dataset snapshots"""
+
+    def __init__(self, path: str = METRIC_SERIES_PATH):
+        self.path = path
+        self._series: Dict[str, Dict[str, Series]] = {metric: {} for metric in SERIES_METRICS}
+        self._lock = threading.RLock()
+        self._synced_versions: Set[str] = set()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for entry in json.load(f).get("series", []):
+                    if entry.get("metric") in self._series:
+                        series = self._series[entry["metric"]].setdefault(str(entry["hospital_id"]), Series())
+                        for ts, value in zip(entry["t"], entry["v"]):
+                            series.add(int(ts), float(value))
+
+    def sync(self, repo: Repository) -> None:
+        """Record the dataset's current observations once per dataset version.
+
+        A version that was already recorded is skipped even after newer ones,
+        so a reader still on an older snapshot cannot revert newer points.
+        """
+        version = repo.version()
+        if version in self._synced_versions:
+            return
+        with self._lock:
+            if version in self._synced_versions:
+                return
+            added = 0
+            for hospital_id, metric, ts, value in _observations(repo):
+                added += self._series[metric].setdefault(hospital_id, Series()).add(ts, value)
+            if added:
+                self._save()
+                print(f"✅ Recorded {added} metric observations for {version}")
+            self._synced_versions.add(version)
+
+    def _save(self) -> None:
+        payload = {"series": [
+            {"metric": metric, "hospital_id": hospital_id, "t": series.times.tolist(), "v": series.values.tolist()}
+            for metric, by_hospital in self._series.items() for hospital_id, series in by_hospital.items()
+        ]}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def hospital_series(self, metric: str, hospital_ids: Optional[List[str]] = None, granularity: str = "month",
+                        start: Optional[str] = None, end: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Raw points or bucket rollups per hospital between two dates"""
+        _check_metric(metric)
+        _check_granularity(granularity, allow_raw=True)
+        first, last = _day_range(start, end)
+        results = []
+        with self._lock:
+            by_hospital = self._series[metric]
+            for hospital_id in hospital_ids if hospital_ids is not None else sorted(by_hospital):
+                series = by_hospital.get(str(hospital_id))
+                if series is None:
+                    continue
+                if granularity == "raw":
+                    points = [
+                        {"timestamp": datetime.fromtimestamp(series.times[i], tz=timezone.utc).isoformat(), "value": series.values[i]}
+                        for i in series.span(first, last)
+                    ]
+                else:
+                    rollup = series.rollups[granularity]
+                    span = rollup.span(*(None if bound is None else _bucket(granularity, bound) for bound in (first, last)))
+                    points = [
+                        {"period": _bucket_label(granularity, rollup.buckets[i]), "count": rollup.counts[i],
+                         "avg": round(rollup.totals[i] / rollup.counts[i], 4), "min": rollup.lows[i], "max": rollup.highs[i]}
+                        for i in span
+                    ]
+                results.append({"hospital_id": str(hospital_id), "points": points})
+        return results
+
+    def network_trend(self, metric: str, granularity: str = "month",
+                      start: Optional[str] = None, end: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Per bucket: hospitals reporting, the mean of their bucket averages and the lowest/highest of those"""
+        _check_metric(metric)
+        _check_granularity(granularity)
+        first, last = _day_range(start, end)
+        bounds = tuple(None if bound is None else _bucket(granularity, bound) for bound in (first, last))
+        buckets: Dict[int, List[float]] = defaultdict(lambda: [0, 0.0, float("inf"), float("-inf")])
+        with self._lock:
+            for series in self._series[metric].values():
+                rollup = series.rollups[granularity]
+                for i in rollup.span(*bounds):
+                    mean = rollup.totals[i] / rollup.counts[i]
+                    bucket = buckets[rollup.buckets[i]]
+                    bucket[0] += 1
+                    bucket[1] += mean
+                    bucket[2] = min(bucket[2], mean)
+                    bucket[3] = max(bucket[3], mean)
+        return [
+            {"period": _bucket_label(granularity, key), "hospital_count": count,
+             "avg": round(total / count, 4), "min": round(low, 4), "max": round(high, 4)}
+            for key, (count, total, low, high) in sorted(buckets.items())
+        ]
+
+
+_store: Optional[TimeSeriesStore] = None
+_store_lock = threading.Lock()
+
+
+def metric_store(repo: Repository) -> TimeSeriesStore:
+    """Process-wide series store, synced with the repository's current dataset.
+
+    Engines with commit listeners (in-memory snapshots) are synced in commit
+    order on the writer thread only; requests may be pinned to an older
+    snapshot and must not feed it back in.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = TimeSeriesStore()
+                if hasattr(repo, "add_listener"):
+                    repo.add_listener(lambda previous, snapshot, changed: store.sync(snapshot))
+                store.sync(repo)
+                _store = store
+                return _store
+    if not hasattr(repo, "add_listener"):
+        _store.sync(repo)
+    return _store
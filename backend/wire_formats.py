@@ -0,0 +1,117 @@
+"""Alternative wire formats for list-shaped responses.
+
+Clients pick a format with ``?format=`` or the ``Accept`` header:
+
+* ``json`` – the default row-oriented JSON
+* ``columnar`` – JSON with the row list replaced by one array per column
+* ``msgpack`` – the columnar layout encoded as MessagePack (needs ``msgpack``)
+* ``arrow`` – the rows as an Arrow IPC stream (needs ``pyarrow``); the
+  remaining top-level fields travel as JSON in the schema metadata
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, Request, Response
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+FORMAT_MEDIA_TYPES = {
+    "json": "application/json",
+    "columnar": "application/vnd.payer.columnar+json",
+    "msgpack": "application/msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+MEDIA_TYPE_FORMATS = {media_type: fmt for fmt, media_type in FORMAT_MEDIA_TYPES.items()}
+MEDIA_TYPE_FORMATS["application/x-msgpack"] = "msgpack"
+
+
+def requested_format(request: Request) -> str:
+    """Wire format asked for by the ``format`` query parameter or Accept header"""
+    fmt = request.query_params.get("format")
+    if fmt:
+        if fmt not in FORMAT_MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMAT_MEDIA_TYPES)}")
+        return fmt
+
+    accepted = []
+    for position, part in enumerate(request.headers.get("accept", "").split(",")):
+        media_type, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media_type.strip().lower() in MEDIA_TYPE_FORMATS and q > 0:
+            accepted.append((-q, position, MEDIA_TYPE_FORMATS[media_type.strip().lower()]))
+    return min(accepted)[2] if accepted else "json"
+
+
+def to_columns(rows: List[Dict]) -> Dict[str, List[Any]]:
+    """One list per column, in first-seen key order, with None for missing keys"""
+    names: Dict[str, None] = {}
+    for row in rows:
+        for name in row:
+            names.setdefault(name, None)
+    return {name: [row.get(name) for row in rows] for name in names}
+
+
+def _dumps(payload: Any) -> bytes:
+    return json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def _arrow_array(values: List[Any]):
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        # Mixed or nested values that Arrow cannot infer travel as JSON text
+        return pa.array([None if value is None else json.dumps(value, default=str) for value in values], type=pa.string())
+
+
+def _arrow_stream(rows: List[Dict], metadata: Dict[str, Any]) -> bytes:
+    columns = to_columns(rows)
+    table = pa.table({name: _arrow_array(values) for name, values in columns.items()})
+    table = table.replace_schema_metadata({"payload": json.dumps(metadata, default=str)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def render(request: Request, payload: Any, rows_key: Optional[str] = None) -> Any:
+    """Encode ``payload`` in the requested wire format.
+
+    ``rows_key`` names the list of row objects inside a dict payload; leave it
+    unset when the payload itself is the list. JSON requests get the payload
+    back unchanged so FastAPI serializes it as usual.
+    """
+    fmt = requested_format(request)
+    if fmt == "json":
+        return payload
+
+    rows = payload if rows_key is None else payload.get(rows_key) or []
+    metadata = {} if rows_key is None else {key: value for key, value in payload.items() if key != rows_key}
+
+    if fmt == "arrow":
+        if pa is None:
+            raise HTTPException(status_code=406, detail="Arrow output requires the pyarrow package")
+        return Response(content=_arrow_stream(rows, metadata), media_type=FORMAT_MEDIA_TYPES[fmt])
+
+    columnar = dict(metadata, layout="columnar", row_count=len(rows), columns=to_columns(rows))
+    if rows_key is not None:
+        columnar["rows_key"] = rows_key
+    if fmt == "msgpack":
+        if msgpack is None:
+            raise HTTPException(status_code=406, detail="MessagePack output requires the msgpack package")
+        return Response(content=msgpack.packb(columnar, default=str), media_type=FORMAT_MEDIA_TYPES[fmt])
+    return Response(content=_dumps(columnar), media_type=FORMAT_MEDIA_TYPES[fmt])
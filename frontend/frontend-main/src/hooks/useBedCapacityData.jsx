@@ -16,44 +16,49 @@ export const useBedCapacityData = (selectedHospital = 'all', timeRange = '7d') =
         setLoading(true);
         setError(null);
 
-        const [hospitalsResponse] = await Promise.all([
-          api.get('/hospitals')
-        ]);
+        // Server-side rollups of wards_rooms.json (one small aggregated payload)
+        const response = await api.get('/analytics/bed-capacity');
+        const { rollups } = response.data;
 
-        const hospitalsData = hospitalsResponse.data.hospitals || hospitalsResponse.data;
-        
-        // Enhance hospital data with bed capacity information
-        const enhancedHospitals = hospitalsData.map(hospital => ({
-          ...hospital,
-          total_beds: hospital.beds_registered || Math.floor(Math.random() * 1000) + 200,
-          occupied_beds: Math.floor((hospital.beds_registered || 400) * (0.7 + Math.random() * 0.25)),
-          departments: generateDepartmentData(hospital)
-        }));
+        const departmentsByHospital = rollups.hospital_ward_type.reduce((acc, row) => {
+          (acc[row.hospital_id] = acc[row.hospital_id] || []).push({
+            name: row.ward_type,
+            total_beds: row.total_beds,
+            occupied: row.occupied_beds,
+            occupancy_rate: row.occupancy_rate
+          });
+          return acc;
+        }, {});
 
-        // Calculate available beds
-        enhancedHospitals.forEach(hospital => {
-          hospital.available_beds = hospital.total_beds - hospital.occupied_beds;
-          hospital.occupancy_rate = hospital.total_beds > 0 ? hospital.occupied_beds / hospital.total_beds : 0;
-        });
+        const enhancedHospitals = rollups.hospital.map(row => ({
+          id: row.hospital_id,
+          name: row.hospital_name,
+          city: row.city,
+          state: row.state,
+          total_beds: row.total_beds,
+          occupied_beds: row.occupied_beds,
+          available_beds: row.available_beds,
+          occupancy_rate: row.occupancy_rate,
+          avg_daily_rate: row.avg_daily_rate,
+          departments: departmentsByHospital[row.hospital_id] || []
+        }));
 
         setHospitals(enhancedHospitals);
 
-        // Generate ward data
-        const wardData = enhancedHospitals.flatMap(hospital => 
-          hospital.departments.map((dept, index) => ({
-            id: `${hospital.id}-${index}`,
-            hospital_id: hospital.id,
-            hospital_name: hospital.name,
-            department: dept.name,
-            total_beds: dept.total_beds,
-            occupied_beds: dept.occupied,
-            available_beds: dept.total_beds - dept.occupied,
-            occupancy_rate: dept.occupancy_rate,
-            avg_length_of_stay: Math.random() * 5 + 2,
-            turnover_rate: Math.random() * 10 + 5,
-            wait_time: dept.name === 'Emergency' ? Math.random() * 120 + 30 : 0
-          }))
-        );
+        const wardData = rollups.hospital_ward_type.map((row, index) => ({
+          id: `${row.hospital_id}-${index}`,
+          hospital_id: row.hospital_id,
+          hospital_name: row.hospital_name,
+          department: row.ward_type,
+          total_beds: row.total_beds,
+          occupied_beds: row.occupied_beds,
+          available_beds: row.available_beds,
+          occupancy_rate: row.occupancy_rate,
+          avg_daily_rate: row.avg_daily_rate,
+          avg_length_of_stay: Math.random() * 5 + 2,
+          turnover_rate: Math.random() * 10 + 5,
+          wait_time: row.ward_type === 'Emergency' ? Math.random() * 120 + 30 : 0
+        }));
 
         setWards(wardData);
         generateAlerts(wardData);
@@ -75,33 +80,6 @@ export const useBedCapacityData = (selectedHospital = 'all', timeRange = '7d') =
     fetchData();
   }, []);
 
-  // Generate department data for a hospital
-  const generateDepartmentData = (hospital) => {
-    const departments = [
-      { name: 'ICU', ratio: 0.1 },
-      { name: 'Emergency', ratio: 0.08 },
-      { name: 'General Ward', ratio: 0.4 },
-      { name: 'Pediatrics', ratio: 0.15 },
-      { name: 'Maternity', ratio: 0.12 },
-      { name: 'Surgery', ratio: 0.15 }
-    ];
-
-    const totalBeds = hospital.beds_registered || 400;
-    
-    return departments.map(dept => {
-      const deptBeds = Math.floor(totalBeds * dept.ratio);
-      const occupancyRate = 0.6 + Math.random() * 0.35; // 60-95%
-      const occupied = Math.floor(deptBeds * occupancyRate);
-      
-      return {
-        name: dept.name,
-        total_beds: deptBeds,
-        occupied: occupied,
-        occupancy_rate: occupancyRate
-      };
-    });
-  };
-
   // Generate alerts based on occupancy rates
   const generateAlerts = (wardData) => {
     const newAlerts = [];
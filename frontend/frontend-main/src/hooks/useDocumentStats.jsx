@@ -15,44 +15,34 @@ const useDocumentStats = () => {
   useEffect(() => {
     const loadData = async () => {
       try {
-        const [hospitalsRes, docsRes] = await Promise.all([
+        const [hospitalsRes, verificationRes] = await Promise.all([
           dataService.fetchHospitalsData(),
-          dataService.getDocumentUploads()
+          dataService.getDocumentVerification()
         ]);
         if (!hospitalsRes.success) throw new Error(hospitalsRes.error);
-        if (!docsRes.success) throw new Error(docsRes.error);
+        if (!verificationRes.success) throw new Error(verificationRes.error);
 
         const hospitals = hospitalsRes.data.hospitals || hospitalsRes.data;
-        const documents = docsRes.data;
-
-        // Group documents by hospital
-        const hospitalStats = hospitals.map(hospital => {
-          const docsForHospital = documents.filter(doc => String(doc.entity_id) === String(hospital.id));
-          const docStatus = {};
-          docsForHospital.forEach(doc => {
-            docStatus[doc.document_type] = {
-              status: doc.is_verified ? 'verified' : 'pending',
-              file_name: doc.file_name
-            };
-          });
-          return {
-            id: hospital.id,
-            name: hospital.name,
-            documents: docStatus
-          };
+        const verification = verificationRes.data;
+
+        // Per-hospital document status comes precomputed from the backend
+        const entityStats = {};
+        (verification.by_entity || []).forEach(entity => {
+          if (entity.entity_type === 'hospital') {
+            entityStats[String(entity.entity_id)] = entity.documents;
+          }
         });
 
-        // Calculate totals
-        let totalVerified = 0, totalPending = 0, totalRejected = 0;
-        documents.forEach(doc => {
-          if (doc.is_verified) totalVerified++;
-          else totalPending++;
-        });
+        const hospitalStats = hospitals.map(hospital => ({
+          id: hospital.id,
+          name: hospital.name,
+          documents: entityStats[String(hospital.id)] || {}
+        }));
 
         setStats({
-          totalVerified,
-          totalPending,
-          totalRejected, // Not implemented in backend, so always 0
+          totalVerified: verification.verified,
+          totalPending: verification.pending,
+          totalRejected: verification.rejected,
           hospitals: hospitalStats
         });
       } catch (err) {